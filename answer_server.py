@@ -0,0 +1,177 @@
+"""Keeps the local index and API clients loaded between questions.
+
+`python retrieve-trusted-content.py --serve` runs the server; the CLI then
+sends its questions here instead of loading ./storage itself. Only the
+standard library is imported at module level so that the client side stays
+quick to start; the server imports trusted_content when it starts.
+"""
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = int(os.getenv("ANSWER_SERVER_PORT", 8642))
+
+
+def request_error(path: str, request) -> str | None:
+    """Why a POST body cannot be answered, or None if it can."""
+    if not isinstance(request, dict):
+        return "Request body must be a JSON object"
+    if path == "/batch":
+        questions = request.get("questions")
+        if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+            return '"questions" must be a list of strings'
+    elif not isinstance(request.get("query"), str) or not request["query"].strip():
+        return '"query" must be a non-empty string'
+    top_k, min_similarity = request.get("top_k", 5), request.get("min_similarity", 0.7)
+    # type() rather than isinstance, so that JSON true and false are not taken for numbers
+    if type(top_k) is not int or top_k < 1:
+        return '"top_k" must be a positive integer'
+    if min_similarity is not None and type(min_similarity) not in (int, float):
+        return '"min_similarity" must be a number or null'
+    return None
+
+
+def make_handler(content):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, payload, status: int = 200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _missing_store(self) -> bool:
+            """Reply 503 and return True when ./storage holds no index."""
+            if content.get_store()[0] is not None:
+                return False
+            self._send({"status": "unavailable", "storage": os.path.abspath(content.STORAGE_DIR),
+                        "error": "No index found; build it with create-local-store.py"}, 503)
+            return True
+
+        def do_GET(self):
+            if self.path.rstrip("/") != "/health":
+                return self._send({"error": "Not Found"}, 404)
+            if self._missing_store():
+                return
+            index, keywords = content.get_store()
+            self._send({"status": "ok", "pid": os.getpid(), "storage": os.path.abspath(content.STORAGE_DIR),
+                        "chunks": len(index.vector_store), "keyword_index": keywords is not None})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            path = self.path.rstrip("/")
+            if path not in ("/retrieve", "/answer", "/batch"):
+                return self._send({"error": "Not Found"}, 404)
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError as e:
+                return self._send({"error": f"Request body is not valid JSON: {e}"}, 400)
+            error = request_error(path, request)
+            if error:
+                return self._send({"error": error}, 400)
+            if self._missing_store():
+                return
+            options = {"top_k": request.get("top_k", 5), "min_similarity": request.get("min_similarity", 0.7)}
+            try:
+                if path == "/retrieve":
+                    start = time.perf_counter()
+                    excerpts = content.retrieve_trusted_content(request["query"], **options)
+                    return self._send({"excerpts": excerpts,
+                                       "timings": {"retrieve_ms": round((time.perf_counter() - start) * 1000, 1)}})
+                if path == "/answer":
+                    answer, timings = content.chat_with_retrieval(request["query"], **options)
+                    return self._send({"answer": answer, "timings": timings,
+                                       "embedding_cache": content.Settings.embed_model.cache.summary()})
+                if path == "/batch":
+                    return self._batch(request, options)
+            except Exception as e:
+                return self._send({"error": f"{type(e).__name__}: {e}"}, 500)
+
+        def _batch(self, request: dict, options: dict):
+            # Lines are streamed back as answers finish
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            handler = self
+
+            class ChunkedWriter:
+                def write(self, data: str):
+                    body = data.encode()
+                    handler.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+
+                def flush(self):
+                    handler.wfile.flush()
+
+            writer = ChunkedWriter()
+            # The status line is already sent, so a failure is reported as the last line
+            try:
+                counts = content.answer_batch(request["questions"], writer, concurrency=request.get("concurrency", 8),
+                                              per_minute=request.get("requests_per_minute", 300),
+                                              batch_size=request.get("batch_size", 256), **options)
+                writer.write(json.dumps({"summary": counts}) + "\n")
+            except Exception as e:
+                writer.write(json.dumps({"error": f"{type(e).__name__}: {e}"}) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def serve(port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Load the store and clients and bind 127.0.0.1:port; the caller runs serve_forever."""
+    import trusted_content
+
+    trusted_content.get_store()
+    trusted_content.get_client()
+    return ThreadingHTTPServer(("127.0.0.1", port), make_handler(trusted_content))
+
+
+def post(path: str, payload: dict, port: int = DEFAULT_PORT, timeout: float = 600):
+    """The server's JSON reply, or None when no server is listening on port."""
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        try:
+            return json.load(e)
+        except ValueError:
+            raise RuntimeError(f"Port {port} is answered by something other than the answer server") from e
+    except urllib.error.URLError as e:
+        if isinstance(e.reason, ConnectionRefusedError):
+            return None
+        raise
+
+
+def stream(path: str, payload: dict, port: int = DEFAULT_PORT, timeout: float = 3600):
+    """Lines of a streamed reply as they arrive, or None when no server is listening."""
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.load(e)["error"]
+        except (ValueError, KeyError):
+            message = f"Port {port} is answered by something other than the answer server"
+        raise RuntimeError(message) from e
+    except urllib.error.URLError as e:
+        if isinstance(e.reason, ConnectionRefusedError):
+            return None
+        raise
+
+    def lines():
+        with response:
+            for line in response:
+                yield line.decode()
+    return lines()
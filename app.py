@@ -1,12 +1,38 @@
 import streamlit as st
 from openai import OpenAI
 from llama_cloud_services import LlamaCloudIndex
+from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters
+from query_cache import QueryCache, normalize_query
+from prompting import assemble_prompt
+from retrieval import merge_excerpts, mmr_rerank, reciprocal_rank_fusion
+from concurrent.futures import ThreadPoolExecutor
+from telemetry import Trace, start_exporter
+import os
+import time
 
 AVAILABLE_INDEXES = {
     'csg-docs': 'General Purpose Index (default)',
     'csg-docs-2': 'JRI Documents Index', 
     'csg-adc-reports': 'Corrections Reports Index (coming soon!)'
 }
+# Selectbox entry that searches every available index at once
+ALL_INDEXES = 'all'
+INDEX_OPTIONS = {**AVAILABLE_INDEXES, ALL_INDEXES: 'All Indexes (searched together)'}
+
+# Retrieved excerpts and first-turn answers are shared across sessions for
+# this long, so repeated questions skip LlamaCloud and the LLM
+CACHE_TTL_SECONDS = 15 * 60
+CACHE_MAX_ENTRIES = 512
+
+# Token budget for each chat request, and the share conversation history may use
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 12000))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 3000))
+
+# With diversity reranking on, this many times top_n candidates are retrieved to choose from
+MMR_CANDIDATE_FACTOR = 3
+
+# Report metadata create-remote-store.py records on each file, offered as sidebar filters
+SCOPE_FIELDS = {'year': 'Publication Years:', 'title': 'Reports:'}
 
 # Initialize the LlamaCloud index
 @st.cache_resource
@@ -28,26 +54,100 @@ def initialize_index(index_name: str):
 def get_openai_client():
     return OpenAI(api_key=st.secrets['openai_key'])
 
-def retrieve_trusted_content(index: LlamaCloudIndex, query: str, top_k: int, 
-                             min_similarity: float):
-    retriever = index.as_retriever(similarity_top_k=top_k)
-    nodes = retriever.retrieve(query)
-    filtered_nodes = [node for node in nodes if node.score >= min_similarity]
-    print(filtered_nodes)
+@st.cache_resource
+def get_query_caches():
+    # cache_resource makes these process-wide, shared by every session
+    return {
+        "retrieval": QueryCache(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES),
+        "answer": QueryCache(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES),
+    }
+
+@st.cache_resource
+def get_retriever(index_name: str, top_k: int, scope: tuple = ()):
+    # Building a retriever resolves the project and pipeline over the network,
+    # so reuse one per index, top_k and scope instead of paying that on every query.
+    # The scope becomes a LlamaCloud metadata filter, applied before chunks are scored
+    filters = MetadataFilters(filters=[MetadataFilter(key=field, value=list(values), operator=FilterOperator.IN)
+                                       for field, values in scope]) if scope else None
+    return initialize_index(index_name=index_name).as_retriever(similarity_top_k=top_k, filters=filters)
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def scope_options(index_names: tuple) -> dict:
+    """field -> sorted values recorded on the files of the given indexes."""
+    options = {field: set() for field in SCOPE_FIELDS}
+    for name in index_names:
+        index = initialize_index(index_name=name)
+        for file in index._client.pipelines.list_pipeline_files(pipeline_id=index.id):
+            for field in SCOPE_FIELDS:
+                value = (file.custom_metadata or {}).get(field)
+                if value is not None:
+                    options[field].add(str(value))
+    return {field: sorted(values) for field, values in options.items()}
+
+@st.cache_resource
+def get_search_executor():
+    return ThreadPoolExecutor(max_workers=16, thread_name_prefix="index-search")
+
+def searchable_indexes(index_name: str) -> list:
+    if index_name != ALL_INDEXES:
+        return [index_name]
+    return [name for name, label in AVAILABLE_INDEXES.items() if "(coming soon!)" not in label.lower()]
+
+def retrieve_trusted_content(index_names: list, query: str, top_k: int, 
+                             min_similarity: float, trace: Trace | None = None,
+                             diversity: float = 0.0, scope: tuple = ()):
+    trace = trace or Trace("app")
+    fetch_k = top_k * MMR_CANDIDATE_FACTOR if diversity > 0 else top_k
+    # Resolve retrievers here, on the script thread, before any fan-out
+    retrievers = {name: get_retriever(name, fetch_k, scope) for name in index_names}
+    key = (tuple(index_names), normalize_query(query), top_k, min_similarity, diversity, scope)
+    return get_query_caches()["retrieval"].get_or_compute(
+        key, lambda: _retrieve_trusted_content(retrievers, query, top_k, min_similarity, trace, diversity))
+
+def _retrieve_trusted_content(retrievers: dict, query: str, top_k: int, 
+                              min_similarity: float, trace: Trace, diversity: float = 0.0):
+    # LlamaCloud embeds the query and searches server-side, so this is one span
+    with trace.span("search"):
+        if len(retrievers) == 1:
+            nodes = next(iter(retrievers.values())).retrieve(query)
+        else:
+            # Search every index at once, so latency follows the slowest one
+            def search(name):
+                with trace.span(f"search:{name}"):
+                    return retrievers[name].retrieve(query)
+            rankings = list(get_search_executor().map(search, retrievers))
+            nodes = reciprocal_rank_fusion(rankings)
+    with trace.span("filter"):
+        filtered_nodes = [node for node in nodes if node.score >= min_similarity]
+    # Trade a little relevance for coverage, so extra slots don't go to near-duplicates
+    with trace.span("rerank"):
+        filtered_nodes = mmr_rerank(filtered_nodes, top_k, diversity)
+    # Neighbouring chunks of one report become one excerpt without the repeated overlap
+    with trace.span("merge"):
+        filtered_nodes = merge_excerpts(filtered_nodes)
+    trace.set(retrieved=len(nodes), merged_excerpts=len(filtered_nodes))
 
     if not filtered_nodes:
         return ["<no_relevant_content>No sufficiently relevant content found.</no_relevant_content>"]
-    print(filtered_nodes)
     return [f"<excerpt confidence=\"{node.score:.2f}\" source=\"{node.metadata.get('id', '')}\" page=\"{node.metadata.get('page_label', '')}\">{node.text}</excerpt>"  
             for node in filtered_nodes]
 
 def chat_with_retrieval(query: str, conversation_history: list, index_name: str, 
-                        retrieve_n: int, min_similarity: float):
+                        retrieve_n: int, min_similarity: float, diversity: float = 0.0,
+                        scope: tuple = ()):
+    trace = Trace("app", index=index_name, top_k=retrieve_n, min_similarity=min_similarity,
+                  diversity=diversity, scoped=bool(scope))
     # Get trusted content first
-    index = initialize_index(index_name=index_name)
-    excerpts = retrieve_trusted_content(index=index, query=query, 
-                                        top_k=retrieve_n,
-                                        min_similarity=min_similarity)
+    try:
+        with trace.span("retrieve"):
+            excerpts = retrieve_trusted_content(index_names=searchable_indexes(index_name), query=query, 
+                                                top_k=retrieve_n,
+                                                min_similarity=min_similarity,
+                                                trace=trace, diversity=diversity, scope=scope)
+    except Exception as e:
+        trace.fail(e)
+        raise
+    trace.set(excerpts=sum(excerpt.startswith("<excerpt") for excerpt in excerpts))
     # print(excerpts)
     client = get_openai_client()
     
@@ -66,31 +166,38 @@ def chat_with_retrieval(query: str, conversation_history: list, index_name: str,
     - Always tell me the name of the report that you pulled the excerpts from and if information is coming from multiple reports note it. Include those sources at the bottom of the response.
     - Tell me what pages the information is coming from in the response.
     """
-    # Build conversation with retrieved content
-    messages = [{"role": "system", "content": system_message}]
-
-    # Add conversation history
-    messages.extend(conversation_history)
-
-    # Create user message with retrieved content
-    user_message = f"""Question: {query}
-
-    Trusted content:
-    {chr(10).join(excerpts)}
-
-    Please answer the question based only on the provided trusted content above."""
-
-    messages.append({"role": "user", "content": user_message})
-
-    # Make the API call
-    response = client.chat.completions.create(
-        model="gpt-5",
-        messages=messages,
-        temperature=1,  # Default is 1 for gpt-5
-        stream=True
-    )
+    # Fit history and excerpts into the prompt budget, best excerpts first
+    prompt_start = time.perf_counter()
+    messages, report = assemble_prompt(system_message, conversation_history, query, excerpts,
+                                       budget=PROMPT_TOKEN_BUDGET, history_budget=HISTORY_TOKEN_BUDGET)
+    trace.record("prompt", time.perf_counter() - prompt_start)
+    trace.set(**report)
+
+    # Make the API call; time to first token is measured from here
+    request_start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(
+            model="gpt-5",
+            messages=messages,
+            temperature=1,  # Default is 1 for gpt-5
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+    except Exception as e:
+        trace.fail(e)
+        raise
     
-    return response
+    return trace.wrap_stream(response, start=request_start)
+
+def stream_response(response_stream, placeholder) -> str:
+    """Render a streamed completion into placeholder and return its full text."""
+    full_response = ""
+    for chunk in response_stream:
+        # Append streamed content when present
+        if chunk.choices[0].delta.content is not None:
+            full_response += chunk.choices[0].delta.content
+            placeholder.markdown(full_response + "▌")
+    return full_response
 
 def main():
     # App configuration ========================================================
@@ -131,14 +238,14 @@ def main():
     # Set up a dropdown to select the document index ---------------------------
     # Initialize selected index in session state if not present
     if "selected_index" not in st.session_state:
-        st.session_state.selected_index = list(AVAILABLE_INDEXES.keys())[0]
+        st.session_state.selected_index = list(INDEX_OPTIONS.keys())[0]
 
     # Create selectbox for index selection
     selected_index = st.sidebar.selectbox(
         "Select Document Index:",
-        options=list(AVAILABLE_INDEXES.keys()),
-        format_func=lambda x: AVAILABLE_INDEXES[x],
-        index=list(AVAILABLE_INDEXES.keys()).index(st.session_state.selected_index),
+        options=list(INDEX_OPTIONS.keys()),
+        format_func=lambda x: INDEX_OPTIONS[x],
+        index=list(INDEX_OPTIONS.keys()).index(st.session_state.selected_index),
         help="Choose which document index to search. Different indexes may contain different sets of documents curated for different purposes."
     )
     
@@ -173,12 +280,53 @@ def main():
         help="Minimum similarity threshold for retrieved excerpts, between 0.5 and 1.0. Lower values will yield less relevant results."
     )
 
+    # Set up a slider to trade relevance for variety among excerpts -----------
+    diversity = st.sidebar.slider(
+        "Excerpt Diversity:",
+        min_value=0.0,
+        max_value=1.0,
+        value=0.0,
+        step=0.05,
+        help="Above 0, excerpts are reranked so near-duplicate passages give way to different ones; 0 keeps the plain relevance order. Around 0.3 works well for broad questions."
+    )
+
+    # Set up a toggle to reuse answers to the same question --------------------
+    reuse_answers = st.sidebar.checkbox(
+        "Reuse cached answers",
+        value=True,
+        help="Answer an opening question from the shared cache when someone asked the same thing with the same settings in the last few minutes."
+    )
+    # Set up filters that limit which reports are searched -------------------
+    scope = []
+    if "(coming soon!)" not in INDEX_OPTIONS[selected_index].lower():
+        try:
+            options = scope_options(tuple(searchable_indexes(selected_index)))
+        except Exception as e:
+            # Failures are not cached, so the filters come back once LlamaCloud answers again
+            options = {}
+            st.sidebar.caption(f"Report filters are unavailable: {e}")
+        for field, label in SCOPE_FIELDS.items():
+            if options.get(field):
+                selected = st.sidebar.multiselect(
+                    label,
+                    options=options[field],
+                    help="Only search reports with the selected values; leave empty to search them all. Reports uploaded before these were recorded are left out while a filter is set."
+                )
+                if selected:
+                    scope.append((field, tuple(selected)))
+    scope = tuple(scope)
+
+    caches = get_query_caches()
+    st.sidebar.caption(f"Retrieval cache: {caches['retrieval'].summary()}  \nAnswer cache: {caches['answer'].summary()}")
+
     # Check if selected index is coming soon
-    is_coming_soon = "(coming soon!)" in AVAILABLE_INDEXES[selected_index].lower()
+    is_coming_soon = "(coming soon!)" in INDEX_OPTIONS[selected_index].lower()
     if is_coming_soon:
         st.sidebar.warning("This index is coming soon! Please check back later.", icon="🚧")
+    elif selected_index == ALL_INDEXES:
+        st.sidebar.info(f"You would be currently retrieving **up to {top_n} excerpts** for summary **from all available indexes**, searched at the same time.", icon="ℹ️")
     else:
-        st.sidebar.info(f"You would be currently retrieving **up to {top_n} excerpts** for summary **from the {AVAILABLE_INDEXES[selected_index]} index**.", icon="ℹ️")
+        st.sidebar.info(f"You would be currently retrieving **up to {top_n} excerpts** for summary **from the {INDEX_OPTIONS[selected_index]} index**.", icon="ℹ️")
 
 
     # Contact info -------------------------------------------------------------
@@ -206,6 +354,9 @@ def main():
         unsafe_allow_html=True,
     )
 
+    # Expose stage latency metrics when METRICS_PORT is set
+    start_exporter()
+
     # Main app =================================================================
     st.markdown("# CSG Justice Center: *G*uided *A*ggregation of *M*aterials and *B*riefs using *L*arge-Language Models and *E*nhanced *R*ules (GAMBLER)🦙")
     
@@ -229,7 +380,7 @@ def main():
             st.markdown(message["content"])
 
     # Check if selected index is coming soon
-    is_coming_soon = "(coming soon!)" in AVAILABLE_INDEXES[selected_index].lower()
+    is_coming_soon = "(coming soon!)" in INDEX_OPTIONS[selected_index].lower()
     if is_coming_soon:
         st.chat_input("Ask me about CSG Justice Center documents in the selected index...", 
                       disabled=True)
@@ -249,23 +400,25 @@ def main():
             try:
                 # Show a spinner and progress bar while retrieving and streaming the response
                 with st.spinner("Retrieving trusted content and generating response..."):
-                    response_stream = chat_with_retrieval(prompt, messages[:-1], 
-                                                          index_name=selected_index, 
-                                                          retrieve_n=top_n,
-                                                          min_similarity=MIN_SIMILARITY
-                                                          ) 
-
-                    # Stream the response
                     response_placeholder = st.empty()
-                    full_response = ""
-
-
-                    for chunk in response_stream:
-                        # Append streamed content when present
-                        if chunk.choices[0].delta.content is not None:
-                            full_response += chunk.choices[0].delta.content
-                            response_placeholder.markdown(full_response + "▌")
 
+                    def generate():
+                        response_stream = chat_with_retrieval(prompt, messages[:-1], 
+                                                              index_name=selected_index, 
+                                                              retrieve_n=top_n,
+                                                              min_similarity=MIN_SIMILARITY,
+                                                              diversity=diversity,
+                                                              scope=scope
+                                                              ) 
+                        return stream_response(response_stream, response_placeholder)
+
+                    # Only opening questions are shared; follow-ups depend on
+                    # the conversation so far
+                    if reuse_answers and not messages[:-1]:
+                        key = (selected_index, normalize_query(prompt), top_n, MIN_SIMILARITY, diversity, scope)
+                        full_response = get_query_caches()["answer"].get_or_compute(key, generate)
+                    else:
+                        full_response = generate()
 
                     response_placeholder.markdown(full_response)
 
@@ -0,0 +1,87 @@
+"""Recall@k and query latency of the IVF index against exact search.
+
+Runs on the vectors in a persisted ./storage when --storage is given,
+otherwise on synthetic clustered vectors at each of --sizes. Queries are
+perturbed corpus rows, so every query has close neighbours as real
+questions do.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_store import VECTORS_FNAME, IVFIndex, normalize, top_k  # noqa: E402
+
+
+def synthetic(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=n)
+    return normalize(centres[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32))
+
+
+def percentiles(samples: list) -> str:
+    p50, p95 = np.percentile(np.asarray(samples) * 1000, [50, 95])
+    return f"{p50:7.2f} {p95:7.2f}"
+
+
+def run(matrix: np.ndarray, queries: np.ndarray, k: int, nlists: list, nprobes: list):
+    exact, exact_times = [], []
+    for q in queries:
+        start = time.perf_counter()
+        exact.append(set(top_k(matrix @ q, k).tolist()))
+        exact_times.append(time.perf_counter() - start)
+    print(f"{len(matrix):>9} {'exact':>6} {'':>6} {1.0:>9.3f} {percentiles(exact_times)}")
+
+    for nlist in nlists:
+        start = time.perf_counter()
+        ann = IVFIndex.build(matrix, nlist)
+        build = time.perf_counter() - start
+        for nprobe in nprobes:
+            recalls, times = [], []
+            for q, truth in zip(queries, exact):
+                start = time.perf_counter()
+                rows = ann.candidates(q, len(matrix), nprobe)
+                found = rows[top_k(matrix[rows] @ q, k)]
+                times.append(time.perf_counter() - start)
+                recalls.append(len(truth & set(found.tolist())) / len(truth))
+            print(f"{len(matrix):>9} {nlist:>6} {nprobe:>6} {np.mean(recalls):>9.3f} {percentiles(times)}"
+                  f"   (built in {build:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--storage", help="Persisted index directory to benchmark instead of synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nlist", type=int, nargs="+", default=None,
+                        help="Lists to try; defaults to about sqrt(n) and 4*sqrt(n).")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--query-noise", type=float, default=1.0,
+                        help="Norm of the noise added to each (unit-length) query row.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.storage:
+        corpora = [np.load(os.path.join(args.storage, VECTORS_FNAME), mmap_mode='r')]
+    else:
+        corpora = (synthetic(n, args.dim, max(8, n // 500), rng) for n in args.sizes)
+
+    print(f"{'rows':>9} {'nlist':>6} {'nprobe':>6} {f'recall@{args.k}':>9} {'p50 ms':>7} {'p95 ms':>7}")
+    for matrix in corpora:
+        picks = rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)
+        dim = matrix.shape[1]
+        noise = rng.standard_normal((len(picks), dim)).astype(np.float32) * (args.query_noise / np.sqrt(dim))
+        queries = normalize(np.asarray(matrix[np.sort(picks)]) + noise)
+        root = int(np.sqrt(len(matrix)))
+        run(matrix, queries, args.k, args.nlist or [max(1, root), max(1, 4 * root)], args.nprobe)
+
+
+if __name__ == "__main__":
+    main()
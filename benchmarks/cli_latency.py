@@ -0,0 +1,104 @@
+"""Cold versus warm latency of retrieve-trusted-content.py, fully offline.
+
+Runs the CLI --runs times in a fresh process with --no-server (cold: every
+run imports llama_index and loads the index in --storage), then starts the
+answer server and runs it again as a thin client (warm). Also times the
+server's /retrieve endpoint directly, which is retrieval alone without
+process startup or the completion. Completions and embeddings come from the
+OpenAI stub, so build --storage against the stub as for load_test.py.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import answer_server  # noqa: E402
+import openai_stub  # noqa: E402
+
+SCRIPT = os.path.join(ROOT, "retrieve-trusted-content.py")
+
+
+def run_cli(question: str, *flags) -> float:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, SCRIPT, *flags, question], capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stdout + result.stderr)
+    return elapsed
+
+
+def wait_for_server(port: int, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Answer server did not start on port {port}")
+
+
+def report(name: str, seconds: list):
+    p50, p95 = np.percentile(np.asarray(seconds) * 1000, [50, 95])
+    print(f"{name:<28} {p50:>9.1f} {p95:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--storage", default=os.path.join(ROOT, "storage"), help="Index the CLI loads.")
+    parser.add_argument("--question", default="What are the main drivers of prison population growth in Ohio?")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ttft", type=float, default=0.5, help="Stub seconds before the first token.")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Stub seconds between tokens.")
+    parser.add_argument("--tokens", type=int, default=150, help="Tokens in each stub completion.")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Stub embeddings seconds.")
+    parser.add_argument("--openai-port", type=int, default=8011)
+    parser.add_argument("--server-port", type=int, default=8642)
+    args = parser.parse_args()
+
+    os.environ.update({
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.openai_port}/v1",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{args.openai_port}/v1",
+        "CHATGPT_API_KEY": "stub",
+        "LOCAL_STORAGE_DIR": args.storage,
+        "ANSWER_SERVER_PORT": str(args.server_port),
+    })
+    openai_stub.serve(args.openai_port, args.ttft, args.token_latency, args.tokens, args.embedding_latency)
+    port_flags = ("--port", str(args.server_port))
+
+    # The first run also fills the embedding cache, so it is left out
+    run_cli(args.question, "--no-server", *port_flags)
+    cold = [run_cli(args.question, "--no-server", *port_flags) for _ in range(args.runs)]
+
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, SCRIPT, "--serve", *port_flags],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_server(args.server_port)
+        startup = time.perf_counter() - start
+        warm = [run_cli(args.question, *port_flags) for _ in range(args.runs)]
+        retrieve = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            answer_server.post("/retrieve", {"query": args.question}, port=args.server_port)
+            retrieve.append(time.perf_counter() - start)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{args.runs} runs each; answer server took {startup:.1f}s to start")
+    print(f"{'':<28} {'p50 ms':>9} {'p95 ms':>9}")
+    report("cold CLI (loads index)", cold)
+    report("warm CLI (answer server)", warm)
+    report("warm /retrieve over HTTP", retrieve)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Local stand-in for the publications site pull-files.py crawls.
+
+Point the crawlers at it with --root-url http://127.0.0.1:<port>/publications/page/.
+It serves --listing-pages listing pages of --per-page publications each
+(404 past the last), a page per publication linking its report, and the
+reports themselves: generated PDFs of --report-pages pages (about 4.5 KB
+a page) under /wp-content/uploads/<year>/<month>/, as WordPress files them.
+
+Reports carry an ETag and Last-Modified and honour If-None-Match,
+If-Modified-Since, Range and If-Range, so unchanged files come back 304
+and interrupted ones resume with a 206. With --drop-after the first full
+transfer of each report is cut off after that many bytes, which must be
+fewer than a report holds, to exercise the resume path; crawl_resume.py
+checks it end to end. With --duplicate-every every Nth publication links
+the previous one's report under a URL of its own.
+"""
+import argparse
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LISTING = re.compile(r"^/publications/page/(\d+)/?$")
+PUBLICATION = re.compile(r"^/publications/report-(\d+)/?$")
+REPORT = re.compile(r"^/wp-content/uploads/\d{4}/\d\d/report-(\d+)\.pdf$")
+RANGE = re.compile(r"^bytes=(\d+)-(\d*)$")
+LAST_MODIFIED = formatdate(1700000000, usegmt=True)
+VOCABULARY = (
+    "recidivism reentry probation parole supervision sentencing incarceration prison jail county state "
+    "justice reinvestment behavioral health mental substance use treatment program funding legislature "
+    "policy data analysis outcomes young adults juvenile youth victims services housing employment "
+    "workforce corrections population growth costs savings revocation technical violations risk needs "
+    "assessment community pretrial detention release crime rates law enforcement police courts judges"
+).split()
+
+
+def make_pdf(lines_per_page: list) -> bytes:
+    """A minimal PDF with one page per list of text lines, in Helvetica."""
+    count = len(lines_per_page)
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(count))
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               f"<< /Type /Pages /Kids [{kids}] /Count {count} >>".encode(),
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for i, lines in enumerate(lines_per_page):
+        text = " ".join("(" + re.sub(r"([()\\])", r"\\\1", line) + ") '" for line in lines)
+        stream = f"BT /F1 11 Tf 14 TL 50 760 Td {text} ET".encode()
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {5 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def report(number: int, pages: int, lines: int = 40, words_per_line: int = 12) -> bytes:
+    rng = random.Random(number)
+    topic = rng.sample(VOCABULARY, 6)
+    body = [[f"Report {number}: {' '.join(topic[:3]).title()}"] if page == 0 else [] for page in range(pages)]
+    for page in body:
+        while len(page) < lines:
+            # Each report leans on a handful of topic words, so retrieval has something to find
+            page.append(" ".join(rng.choice(topic) if rng.random() < 0.3 else rng.choice(VOCABULARY)
+                                 for _ in range(words_per_line)))
+    return make_pdf(body)
+
+
+class State:
+    def __init__(self, listing_pages: int, per_page: int, report_pages: int, latency: float = 0.0,
+                 drop_after: int = 0, duplicate_every: int = 0):
+        self.listing_pages = listing_pages
+        self.per_page = per_page
+        self.report_pages = report_pages
+        self.latency = latency
+        self.drop_after = drop_after
+        self.duplicate_every = duplicate_every
+        self.lock = threading.Lock()
+        self.reports = {}
+        self.dropped = set()
+        # Status codes of the report responses sent so far
+        self.served = Counter()
+
+    def exists(self, number: int) -> bool:
+        return 0 <= number < self.listing_pages * self.per_page
+
+    def report_path(self, number: int) -> str:
+        # Newer publications come first, as on the site, and are dated accordingly
+        year, month = 2024 - number // 12, 12 - number % 12
+        return f"/wp-content/uploads/{year}/{month:02d}/report-{number}.pdf"
+
+    def report(self, number: int) -> tuple:
+        """(body, ETag) of a report, generated once."""
+        if self.duplicate_every and number % self.duplicate_every == self.duplicate_every - 1:
+            number -= 1
+        with self.lock:
+            if number not in self.reports:
+                body = report(number, self.report_pages)
+                self.reports[number] = (body, '"' + hashlib.sha1(body).hexdigest()[:16] + '"')
+            return self.reports[number]
+
+    def drop(self, number: int) -> bool:
+        """Whether to cut off this transfer of the report: only the first full one is."""
+        with self.lock:
+            if not self.drop_after or number in self.dropped:
+                return False
+            self.dropped.add(number)
+            return True
+
+    def record(self, status: int):
+        with self.lock:
+            self.served[status] += 1
+
+
+def make_handler(state: State):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, body: bytes, status: int = 200, content_type: str = "text/html; charset=utf-8",
+                  headers: dict | None = None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _page(self, links: list, label: str) -> bytes:
+            base = f"http://{self.headers.get('Host')}"
+            anchors = "\n".join(f'<a class="button" href="{base}{link}">{label}</a>' for link in links)
+            return f"<html><body>\n{anchors}\n</body></html>".encode()
+
+        def do_GET(self):
+            time.sleep(state.latency)
+            path = self.path.split("?")[0]
+            if match := LISTING.match(path):
+                page = int(match.group(1))
+                if not 1 <= page <= state.listing_pages:
+                    return self._send(b"Not found", 404)
+                first = (page - 1) * state.per_page
+                return self._send(self._page([f"/publications/report-{number}/"
+                                              for number in range(first, first + state.per_page)], "Read More"))
+            if (match := PUBLICATION.match(path)) and state.exists(int(match.group(1))):
+                return self._send(self._page([state.report_path(int(match.group(1)))], "Download"))
+            if (match := REPORT.match(path)) and path == state.report_path(int(match.group(1))):
+                return self._report(int(match.group(1)))
+            return self._send(b"Not found", 404)
+
+        def _report(self, number: int):
+            body, etag = state.report(number)
+            validators = {"ETag": etag, "Last-Modified": LAST_MODIFIED, "Accept-Ranges": "bytes"}
+            if self._unchanged(etag):
+                state.record(304)
+                self.send_response(304)
+                for key, value in validators.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                return
+
+            match = RANGE.match(self.headers.get("Range", ""))
+            if_range = self.headers.get("If-Range")
+            if match and (if_range is None or if_range in (etag, LAST_MODIFIED)):
+                start = int(match.group(1))
+                end = min(int(match.group(2) or len(body) - 1), len(body) - 1)
+                if start >= len(body):
+                    state.record(416)
+                    return self._send(b"", 416, "application/pdf", {"Content-Range": f"bytes */{len(body)}"})
+                state.record(206)
+                return self._send(body[start:end + 1], 206, "application/pdf",
+                                  {**validators, "Content-Range": f"bytes {start}-{end}/{len(body)}"})
+
+            state.record(200)
+            if state.drop(number):
+                # Promise the whole report, send part of it and hang up
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in validators.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body[:state.drop_after])
+                self.close_connection = True
+                return
+            return self._send(body, 200, "application/pdf", validators)
+
+        def _unchanged(self, etag: str) -> bool:
+            if "If-None-Match" in self.headers:
+                return etag in [tag.strip() for tag in self.headers["If-None-Match"].split(",")]
+            if "If-Modified-Since" in self.headers:
+                try:
+                    since = parsedate_to_datetime(self.headers["If-Modified-Since"])
+                except (TypeError, ValueError):
+                    return False
+                return since >= parsedate_to_datetime(LAST_MODIFIED)
+            return False
+
+    return Handler
+
+
+def serve(port: int = 8020, listing_pages: int = 3, per_page: int = 10, report_pages: int = 20,
+          latency: float = 0.0, drop_after: int = 0, duplicate_every: int = 0) -> ThreadingHTTPServer:
+    """Start the fixture site in a background thread; its State is on the server as .state."""
+    state = State(listing_pages, per_page, report_pages, latency, drop_after, duplicate_every)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--listing-pages", type=int, default=3,
+                        help="Listing pages before the 404 that ends the crawl.")
+    parser.add_argument("--per-page", type=int, default=10,
+                        help="Publications linked from each listing page.")
+    parser.add_argument("--report-pages", type=int, default=20,
+                        help="Pages in each generated report.")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds each request takes before it is answered.")
+    parser.add_argument("--drop-after", type=int, default=0,
+                        help="Cut off the first full transfer of each report after this many bytes; "
+                             "keep it below the report size (about 4.5 KB a page) so there is a rest to resume.")
+    parser.add_argument("--duplicate-every", type=int, default=0,
+                        help="Every Nth publication links the previous one's report.")
+    args = parser.parse_args()
+    server = serve(args.port, args.listing_pages, args.per_page, args.report_pages, args.latency,
+                   args.drop_after, args.duplicate_every)
+    print(f"Crawl fixture listening on http://127.0.0.1:{args.port}/publications/page/")
+    try:
+        # serve() already answers requests in its own thread
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
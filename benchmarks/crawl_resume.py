@@ -0,0 +1,85 @@
+"""Check that interrupted downloads resume with Range requests, fully offline.
+
+Serves the crawl fixture with every report's first transfer cut off after
+--drop-after bytes, then downloads each report three times with the
+crawler: the first pass leaves partial files, the second must resume them
+with 206 responses and end with the fixture's exact bytes, and the third
+must find every file unchanged (304). Exits non-zero if any check fails.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from crawler import Crawler, Manifest  # noqa: E402
+import crawl_fixture  # noqa: E402
+
+
+def download_all(crawler: Crawler, state: crawl_fixture.State, urls: list, out: str) -> tuple:
+    """(stored file names, status counts the fixture sent, seconds) for one pass over urls."""
+    manifest = Manifest(out)
+    before = state.served.copy()
+    start = time.perf_counter()
+    files = crawler.map(lambda url: crawler.download(url, out, manifest), urls)
+    return files, state.served - before, time.perf_counter() - start
+
+
+def sha256_of(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=20)
+    parser.add_argument("--report-pages", type=int, default=20)
+    parser.add_argument("--drop-after", type=int, default=30000,
+                        help="Bytes of each report's first transfer before the fixture hangs up.")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8021)
+    args = parser.parse_args()
+
+    server = crawl_fixture.serve(args.port, listing_pages=1, per_page=args.reports,
+                                 report_pages=args.report_pages, drop_after=args.drop_after)
+    state = server.state
+    numbers = range(args.reports)
+    urls = [f"http://127.0.0.1:{args.port}{state.report_path(n)}" for n in numbers]
+    expected = [hashlib.sha256(state.report(n)[0]).hexdigest() for n in numbers]
+    crawler = Crawler(workers=args.workers, per_host=args.workers)
+
+    failures = []
+    with tempfile.TemporaryDirectory() as out:
+        print(f"{'pass':<10} {'200':>5} {'206':>5} {'304':>5} {'stored':>7} {'seconds':>8}")
+        for name in ("dropped", "resumed", "unchanged"):
+            files, served, seconds = download_all(crawler, state, urls, out)
+            stored = sum(file is not None for file in files)
+            print(f"{name:<10} {served[200]:>5} {served[206]:>5} {served[304]:>5} {stored:>7} {seconds:>8.2f}")
+            if name == "dropped":
+                partials = [f for f in os.listdir(out) if f.endswith(".part")]
+                sizes = {os.path.getsize(os.path.join(out, f)) for f in partials}
+                if stored or len(partials) != args.reports or sizes != {args.drop_after}:
+                    failures.append(f"expected {args.reports} partial files of {args.drop_after} bytes, "
+                                    f"got {len(partials)} of sizes {sorted(sizes)}")
+            elif name == "resumed":
+                if served[206] != args.reports or served[200]:
+                    failures.append(f"expected {args.reports} 206 responses and no 200, got {dict(served)}")
+                for n, file in zip(numbers, files):
+                    if file is None or sha256_of(os.path.join(out, file)) != expected[n]:
+                        failures.append(f"report {n} does not match the fixture's sha256")
+            elif served[304] != args.reports:
+                failures.append(f"expected {args.reports} 304 responses, got {dict(served)}")
+    server.shutdown()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Local stand-in for the LlamaCloud API endpoints this repo uses.
+
+Point a client at it with LLAMA_CLOUD_BASE_URL=http://127.0.0.1:<port>.
+Uploaded files report IN_PROGRESS for --ingest-latency seconds before
+they switch to SUCCESS, so upload pipelining can be measured offline.
+
+Each pipeline also holds a synthetic corpus of --corpus-size chunks that
+the retrieve endpoint searches after --retrieve-latency seconds. Scores
+are rescaled so the best match lands near 0.9 and weaker ones fall off
+toward 0.5, roughly the band ada-002 similarities occupy.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from openai_stub import embed
+
+PROJECT_ID = "stub-project"
+ORGANIZATION_ID = "stub-organization"
+CORPUS_DIM = 256
+VOCABULARY = (
+    "recidivism reentry probation parole supervision sentencing incarceration prison jail county state "
+    "justice reinvestment behavioral health mental substance use treatment program funding legislature "
+    "policy data analysis outcomes young adults juvenile youth victims services housing employment "
+    "workforce corrections population growth costs savings revocation technical violations risk needs "
+    "assessment community pretrial detention release crime rates law enforcement police courts judges "
+    "training evaluation grant federal local agencies collaboration report findings recommendations "
+    "texas ohio nevada michigan kansas arizona oklahoma alabama idaho montana washington colorado"
+).split()
+
+
+def synthetic_corpus(name: str, size: int, words_per_chunk: int = 300) -> list:
+    rng = np.random.default_rng(zlib.crc32(name.encode()))
+    nodes = []
+    for i in range(size):
+        # Each chunk leans on a handful of topic words, like a section of a report
+        topic = rng.choice(VOCABULARY, 6, replace=False)
+        words = np.where(rng.random(words_per_chunk) < 0.3, rng.choice(topic, words_per_chunk),
+                         rng.choice(VOCABULARY, words_per_chunk))
+        nodes.append({"id_": f"{name}-{i}", "text": " ".join(words),
+                      "extra_info": {"id": f"report-{i // 40:03d}.pdf", "page_label": str(i % 40 + 1)}})
+    return nodes
+
+
+class State:
+    def __init__(self, ingest_latency: float, upload_latency: float, retrieve_latency: float = 0.3,
+                 corpus_size: int = 2000):
+        self.ingest_latency = ingest_latency
+        self.upload_latency = upload_latency
+        self.retrieve_latency = retrieve_latency
+        self.corpus_size = corpus_size
+        self.lock = threading.Lock()
+        self.pipelines = {}
+        self.files = {}
+        self.pipeline_files = {}
+        self.corpora = {}
+
+    def pipeline(self, name: str) -> dict:
+        with self.lock:
+            for pipeline in self.pipelines.values():
+                if pipeline["name"] == name:
+                    return pipeline
+            pipeline = {"id": str(uuid.uuid4()), "name": name, "project_id": PROJECT_ID,
+                        "embedding_config": {"type": "OPENAI_EMBEDDING", "component": {}}}
+            self.pipelines[pipeline["id"]] = pipeline
+            self.pipeline_files[pipeline["id"]] = {}
+            return pipeline
+
+    def corpus(self, pipeline_id: str) -> tuple:
+        with self.lock:
+            if pipeline_id not in self.corpora:
+                nodes = synthetic_corpus(self.pipelines[pipeline_id]["name"], self.corpus_size)
+                matrix = np.stack([embed(node["text"], CORPUS_DIM) for node in nodes]) if nodes \
+                    else np.empty((0, CORPUS_DIM), dtype=np.float32)
+                self.corpora[pipeline_id] = (nodes, matrix)
+            return self.corpora[pipeline_id]
+
+    def retrieve(self, pipeline_id: str, query: str, top_k: int) -> list:
+        nodes, matrix = self.corpus(pipeline_id)
+        time.sleep(self.retrieve_latency)
+        if not nodes:
+            return []
+        scores = matrix @ embed(query, CORPUS_DIM)
+        best = np.argsort(-scores)[:top_k]
+        scale = max(float(scores[best[0]]), 1e-6)
+        return [{"node": nodes[i], "score": 0.5 + 0.4 * max(float(scores[i]), 0.0) / scale,
+                 "class_name": "NodeWithScore"} for i in best]
+
+
+def make_handler(state: State):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, payload, status: int = 200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _route(self, method: str):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            path = url.path.rstrip("/")
+            body = self._body()
+            project = {"id": PROJECT_ID, "name": "Default", "organization_id": ORGANIZATION_ID}
+
+            if path == "/api/v1/projects":
+                return self._send([project] if method == "GET" else project)
+            if path == f"/api/v1/projects/{PROJECT_ID}":
+                return self._send(project)
+            if path == "/api/v1/pipelines" and method == "PUT":
+                return self._send(state.pipeline(json.loads(body)["name"]))
+            if path == "/api/v1/pipelines" and method == "GET":
+                name = query.get("pipeline_name")
+                with state.lock:
+                    return self._send([p for p in state.pipelines.values() if name in (None, p["name"])])
+            if path == "/api/v1/files" and method == "POST":
+                time.sleep(state.upload_latency)
+                match = re.search(rb'filename="([^"]+)"', body)
+                file = {"id": str(uuid.uuid4()), "name": match.group(1).decode() if match else "upload",
+                        "external_file_id": str(uuid.uuid4()), "project_id": PROJECT_ID,
+                        "file_size": len(body)}
+                with state.lock:
+                    state.files[file["id"]] = file
+                return self._send(file)
+
+            match = re.fullmatch(r"/api/v1/pipelines/([^/]+)/retrieve", path)
+            if match and match.group(1) in state.pipelines and method == "POST":
+                request = json.loads(body)
+                return self._send({
+                    "pipeline_id": match.group(1),
+                    "retrieval_nodes": state.retrieve(match.group(1), request["query"],
+                                                      request.get("dense_similarity_top_k") or 30),
+                    "image_nodes": [], "page_figure_nodes": [], "metadata": {}
+                })
+
+            match = re.fullmatch(r"/api/v1/pipelines/([^/]+)(/files)?(?:/([^/]+))?(/status)?", path)
+            if not match or match.group(1) not in state.pipelines:
+                return self._send({"detail": "Not Found"}, 404)
+            pipeline_id, files, file_id, status = match.groups()
+            pipeline_files = state.pipeline_files[pipeline_id]
+            if not files:
+                return self._send(state.pipelines[pipeline_id])
+            if method == "PUT" and file_id is None:
+                added = []
+                with state.lock:
+                    for request in json.loads(body):
+                        file = state.files[request["file_id"]]
+                        entry = {"id": str(uuid.uuid4()), "file_id": file["id"], "name": file["name"],
+                                 "file_size": file["file_size"], "project_id": PROJECT_ID,
+                                 "pipeline_id": pipeline_id, "custom_metadata": request.get("custom_metadata"),
+                                 "added_at": time.time()}
+                        pipeline_files[file["id"]] = entry
+                        added.append(entry)
+                return self._send(added)
+            if file_id is None:
+                with state.lock:
+                    return self._send(list(pipeline_files.values()))
+            if file_id not in pipeline_files:
+                return self._send({"detail": "Not Found"}, 404)
+            if method == "PUT":
+                with state.lock:
+                    pipeline_files[file_id]["custom_metadata"] = json.loads(body).get("custom_metadata")
+                return self._send(pipeline_files[file_id])
+            if method == "DELETE":
+                with state.lock:
+                    pipeline_files.pop(file_id)
+                self.send_response(204)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if status:
+                done = time.time() - pipeline_files[file_id]["added_at"] >= state.ingest_latency
+                return self._send({"status": "SUCCESS" if done else "IN_PROGRESS"})
+            return self._send(pipeline_files[file_id])
+
+        def do_GET(self):
+            self._route("GET")
+
+        def do_PUT(self):
+            self._route("PUT")
+
+        def do_POST(self):
+            self._route("POST")
+
+        def do_DELETE(self):
+            self._route("DELETE")
+
+    return Handler
+
+
+def serve(port: int = 8010, ingest_latency: float = 5.0, upload_latency: float = 0.5,
+          retrieve_latency: float = 0.3, corpus_size: int = 2000, pipelines: tuple = ()) -> ThreadingHTTPServer:
+    """Start the stub in a background thread, creating the named pipelines up front."""
+    state = State(ingest_latency, upload_latency, retrieve_latency, corpus_size)
+    for name in pipelines:
+        state.corpus(state.pipeline(name)["id"])
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--ingest-latency", type=float, default=5.0,
+                        help="Seconds each uploaded file stays IN_PROGRESS.")
+    parser.add_argument("--upload-latency", type=float, default=0.5,
+                        help="Seconds each file upload takes.")
+    parser.add_argument("--retrieve-latency", type=float, default=0.3,
+                        help="Seconds each retrieve request takes.")
+    parser.add_argument("--corpus-size", type=int, default=2000,
+                        help="Synthetic chunks searched by each pipeline's retrieve endpoint.")
+    parser.add_argument("--pipeline", action="append", default=[],
+                        help="Create a pipeline with this name at startup; repeatable.")
+    args = parser.parse_args()
+    server = serve(args.port, args.ingest_latency, args.upload_latency, args.retrieve_latency,
+                   args.corpus_size, tuple(args.pipeline))
+    print(f"LlamaCloud stub listening on http://127.0.0.1:{args.port}")
+    try:
+        # serve() already answers requests in its own thread
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
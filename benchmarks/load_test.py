@@ -0,0 +1,194 @@
+"""End-to-end latency and throughput of app.py or local-app.py, fully offline.
+
+Starts the OpenAI and LlamaCloud stubs in-process, points the app's
+clients at them, and replays --queries at --concurrency for every
+combination of --top-n and --min-similarity. Reports p50/p95/p99 latency,
+time to first token and requests/sec per setting.
+
+Save a run with --save-baseline; later runs given --baseline exit non-zero
+when p95 latency or p95 time to first token grows, or throughput falls, by
+more than --tolerance.
+
+local-app.py searches the index in --storage, which should be built with
+create-local-store.py while OPENAI_API_BASE points at the stub so that
+stored and query embeddings come from the same model.
+"""
+import argparse
+import importlib.util
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import llamacloud_stub  # noqa: E402
+import openai_stub  # noqa: E402
+
+
+def load_app(name: str):
+    # The apps read their keys from st.secrets; give them throwaway ones
+    secrets = os.path.join(tempfile.mkdtemp(), "secrets.toml")
+    with open(secrets, 'w') as f:
+        f.write('openai_key = "stub"\nLLAMA_CLOUD_API_KEY = "stub"\n')
+    from streamlit import config, logger
+    config.set_option("secrets.files", [secrets])
+    # Outside `streamlit run` every cached call warns about the missing script context
+    logger.set_log_level("error")
+
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), os.path.join(ROOT, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_chat(app, args):
+    if args.app == "app":
+        if not args.warm_cache:
+            # Expire cached retrievals at once, so every request goes to the stub;
+            # concurrent identical queries still coalesce as in production
+            for cache in app.get_query_caches().values():
+                cache.ttl = 0
+        return lambda query, top_n, min_similarity: app.chat_with_retrieval(
+            query, [], index_name=args.index, retrieve_n=top_n, min_similarity=min_similarity,
+            diversity=args.diversity)
+    return lambda query, top_n, min_similarity: app.chat_with_retrieval(
+        query, [], retrieve_n=top_n, min_similarity=min_similarity, diversity=args.diversity)
+
+
+def timed(chat, query: str, top_n: int, min_similarity: float) -> tuple:
+    start = time.perf_counter()
+    ttft = None
+    for chunk in chat(query, top_n, min_similarity):
+        if ttft is None and chunk.choices[0].delta.content:
+            ttft = time.perf_counter() - start
+    return time.perf_counter() - start, ttft
+
+
+def run_setting(chat, queries: list, top_n: int, min_similarity: float, requests: int,
+                concurrency: int) -> dict:
+    def one(query):
+        try:
+            return timed(chat, query, top_n, min_similarity)
+        except Exception as e:
+            print(f"Request failed: {type(e).__name__}: {e}")
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, itertools.islice(itertools.cycle(queries), requests)))
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r is not None]
+    latency = np.asarray([r[0] for r in ok] or [np.nan]) * 1000
+    ttft = np.asarray([r[1] for r in ok if r[1] is not None] or [np.nan]) * 1000
+    p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+    ttft_p50, ttft_p95 = np.percentile(ttft, [50, 95])
+    return {"requests": len(results), "errors": len(results) - len(ok), "rps": len(ok) / elapsed,
+            "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "ttft_p50_ms": ttft_p50, "ttft_p95_ms": ttft_p95}
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    for setting, result in results.items():
+        base = baseline.get(setting)
+        if base is None:
+            continue
+        for metric in ("p95_ms", "ttft_p95_ms"):
+            if result[metric] > base[metric] * (1 + tolerance):
+                found.append(f"{setting}: {metric} {result[metric]:.0f} > baseline {base[metric]:.0f}")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            found.append(f"{setting}: rps {result['rps']:.2f} < baseline {base['rps']:.2f}")
+        if result["errors"] > base.get("errors", 0):
+            found.append(f"{setting}: {result['errors']} errors, baseline {base.get('errors', 0)}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", choices=["app", "local-app"], default="app")
+    parser.add_argument("--queries", default=os.path.join(os.path.dirname(__file__), "queries.txt"),
+                        help="File with one query per line.")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per setting.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--top-n", default="5,10,15", help="Comma-separated top_n values.")
+    parser.add_argument("--min-similarity", default="0.65,0.8", help="Comma-separated thresholds.")
+    parser.add_argument("--index", default="csg-docs",
+                        help="LlamaCloud index app.py queries; 'all' fans out to every index.")
+    parser.add_argument("--diversity", type=float, default=0.0,
+                        help="Excerpt diversity (MMR reranking); 0 turns it off.")
+    parser.add_argument("--storage", default=os.path.join(ROOT, "storage"), help="Index local-app.py loads.")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="Let app.py serve repeated queries from its retrieval cache.")
+    parser.add_argument("--ttft", type=float, default=0.5, help="Stub seconds before the first token.")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Stub seconds between tokens.")
+    parser.add_argument("--tokens", type=int, default=150, help="Tokens in each stub completion.")
+    parser.add_argument("--retrieve-latency", type=float, default=0.3, help="Stub LlamaCloud retrieve seconds.")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Stub embeddings seconds.")
+    parser.add_argument("--corpus-size", type=int, default=2000, help="Chunks in each stub LlamaCloud index.")
+    parser.add_argument("--openai-port", type=int, default=8011)
+    parser.add_argument("--llamacloud-port", type=int, default=8010)
+    parser.add_argument("--baseline", help="Fail if results regress past this saved run.")
+    parser.add_argument("--save-baseline", help="Write results here for later --baseline runs.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression against the baseline.")
+    parser.add_argument("--verbose", action="store_true", help="Print the per-request telemetry log.")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.openai_port}/v1",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{args.openai_port}/v1",
+        "LLAMA_CLOUD_BASE_URL": f"http://127.0.0.1:{args.llamacloud_port}",
+        "CHATGPT_API_KEY": "stub",
+        "LOCAL_STORAGE_DIR": args.storage,
+    })
+    if not args.verbose:
+        logging.getLogger("telemetry").setLevel(logging.WARNING)
+
+    with open(args.queries) as f:
+        queries = [line.strip() for line in f if line.strip()]
+    app = load_app(args.app)
+    openai_stub.serve(args.openai_port, args.ttft, args.token_latency, args.tokens, args.embedding_latency)
+    llamacloud_stub.serve(args.llamacloud_port, retrieve_latency=args.retrieve_latency, corpus_size=args.corpus_size,
+                          pipelines=tuple(app.searchable_indexes(args.index)) if args.app == "app" else ())
+    chat = make_chat(app, args)
+    # Connect to the index and warm the clients outside the measurements
+    timed(chat, queries[0], 5, 0.0)
+
+    print(f"{args.app}: {args.requests} requests per setting at concurrency {args.concurrency}")
+    print(f"{'top_n':>5} {'min_sim':>7} {'req/s':>7} {'p50':>7} {'p95':>7} {'p99':>7} "
+          f"{'ttft50':>7} {'ttft95':>7} {'errors':>6}")
+    results = {}
+    for top_n, min_similarity in itertools.product([int(v) for v in args.top_n.split(",")],
+                                                   [float(v) for v in args.min_similarity.split(",")]):
+        result = run_setting(chat, queries, top_n, min_similarity, args.requests, args.concurrency)
+        results[f"top_n={top_n},min_similarity={min_similarity}"] = result
+        print(f"{top_n:>5} {min_similarity:>7.2f} {result['rps']:>7.2f} {result['p50_ms']:>7.0f} "
+              f"{result['p95_ms']:>7.0f} {result['p99_ms']:>7.0f} {result['ttft_p50_ms']:>7.0f} "
+              f"{result['ttft_p95_ms']:>7.0f} {result['errors']:>6}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({"app": args.app, "results": results}, f, indent=1)
+        print(f"Saved baseline to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline["results"], args.tolerance)
+        if found:
+            print("Latency regressions against baseline:")
+            for line in found:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
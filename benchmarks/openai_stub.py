@@ -0,0 +1,142 @@
+"""Local stand-in for the OpenAI chat-completions and embeddings endpoints.
+
+Point the apps at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 (and
+OPENAI_API_BASE for llama_index embeddings). Streamed completions wait
+--ttft seconds before the first token and --token-latency between tokens;
+embeddings are hashed bags of words, so texts that share words score as
+similar and an index built against the stub retrieves sensibly.
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+EMBEDDING_DIM = 1536
+WORDS = re.compile(r"[a-z0-9]+")
+
+
+def embed(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in WORDS.findall(text.lower()):
+        digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+        vector[digest % dim] += 1.0 if digest >> 63 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class State:
+    def __init__(self, ttft: float, token_latency: float, tokens: int, embedding_latency: float):
+        self.ttft = ttft
+        self.token_latency = token_latency
+        self.tokens = tokens
+        self.embedding_latency = embedding_latency
+
+
+def make_handler(state: State):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, payload, status: int = 200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _chunk(self, data: str):
+            body = data.encode()
+            self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            path = self.path.rstrip("/")
+            if path.endswith("/embeddings"):
+                return self._embeddings(request)
+            if path.endswith("/chat/completions"):
+                return self._chat(request)
+            self._send({"error": {"message": "Not Found"}}, 404)
+
+        def _embeddings(self, request: dict):
+            time.sleep(state.embedding_latency)
+            texts = request["input"]
+            texts = [texts] if isinstance(texts, str) else texts
+            self._send({
+                "object": "list",
+                "model": request.get("model", "text-embedding-ada-002"),
+                "data": [{"object": "embedding", "index": i, "embedding": embed(text).tolist()}
+                         for i, text in enumerate(texts)],
+                "usage": {"prompt_tokens": sum(len(t.split()) for t in texts),
+                          "total_tokens": sum(len(t.split()) for t in texts)},
+            })
+
+        def _chat(self, request: dict):
+            prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+            words = [f"word{i % 97}" for i in range(state.tokens)]
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()),
+                    "model": request.get("model", "gpt-5")}
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                     "total_tokens": prompt_tokens + len(words)}
+            time.sleep(state.ttft)
+
+            if not request.get("stream"):
+                time.sleep(state.token_latency * len(words))
+                return self._send({**base, "object": "chat.completion", "usage": usage, "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": " ".join(words)}}]})
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            base["object"] = "chat.completion.chunk"
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(state.token_latency)
+                delta = {"role": "assistant", "content": word if i == 0 else " " + word}
+                self._chunk("data: " + json.dumps({**base, "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": None}]}) + "\n\n")
+            self._chunk("data: " + json.dumps({**base, "choices": [
+                {"index": 0, "delta": {}, "finish_reason": "stop"}]}) + "\n\n")
+            if (request.get("stream_options") or {}).get("include_usage"):
+                self._chunk("data: " + json.dumps({**base, "choices": [], "usage": usage}) + "\n\n")
+            self._chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def serve(port: int = 8011, ttft: float = 0.5, token_latency: float = 0.02, tokens: int = 150,
+          embedding_latency: float = 0.1) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port),
+                                 make_handler(State(ttft, token_latency, tokens, embedding_latency)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--ttft", type=float, default=0.5, help="Seconds before the first token.")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Seconds between tokens.")
+    parser.add_argument("--tokens", type=int, default=150, help="Tokens in each completion.")
+    parser.add_argument("--embedding-latency", type=float, default=0.1,
+                        help="Seconds each embeddings request takes.")
+    args = parser.parse_args()
+    server = serve(args.port, args.ttft, args.token_latency, args.tokens, args.embedding_latency)
+    print(f"OpenAI stub listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        # serve() already answers requests in its own thread
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
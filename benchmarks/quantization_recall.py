@@ -0,0 +1,90 @@
+"""Memory, latency and recall@k of int8 codes with rescoring against the float32 matrix.
+
+Persists the vectors of --storage (or synthetic clustered vectors at each of
+--sizes) with and without codes and queries each store as loaded from disk.
+"Read MB" is what one query has to read: the whole float32 matrix, or the
+codes plus the rescored shortlist. That is the memory a query process needs
+resident to stay fast; the float32 rows outside the shortlist can stay on
+disk. Recall is measured against exact float32 search; queries are
+perturbed corpus rows, as in ann_recall.py.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_recall import percentiles, synthetic  # noqa: E402
+from llama_index.core.vector_stores.types import VectorStoreQuery  # noqa: E402
+from vector_store import VECTORS_FNAME, MmapVectorStore, normalize, top_k  # noqa: E402
+
+
+def build(path: str, matrix: np.ndarray, mode: str | None) -> MmapVectorStore:
+    store = MmapVectorStore(np.asarray(matrix), [str(i) for i in range(len(matrix))], [None] * len(matrix))
+    store.configure_quantization(mode)
+    store.persist(os.path.join(path, VECTORS_FNAME))
+    return MmapVectorStore.from_persist_dir(path)
+
+
+def disk_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 2 ** 20
+
+
+def run(matrix: np.ndarray, queries: np.ndarray, k: int, rescores: list, root: str):
+    truth = [set(str(i) for i in top_k(np.asarray(matrix @ q), k).tolist()) for q in queries]
+    row_mb = matrix.shape[1] * 4 / 2 ** 20
+    for mode in (None, "int8"):
+        path = os.path.join(root, f"{len(matrix)}-{mode or 'float32'}")
+        os.makedirs(path, exist_ok=True)
+        store = build(path, matrix, mode)
+        for rescore in rescores if mode else [None]:
+            recalls, times = [], []
+            for q, expected in zip(queries, truth):
+                start = time.perf_counter()
+                ids = store.query(VectorStoreQuery(query_embedding=q, similarity_top_k=k), rescore=rescore).ids
+                times.append(time.perf_counter() - start)
+                recalls.append(len(expected & set(ids)) / len(expected))
+            read_mb = len(matrix) * row_mb if mode is None else \
+                store._codes.codes.nbytes / 2 ** 20 + rescore * k * row_mb
+            print(f"{len(matrix):>9} {mode or 'float32':>8} {rescore or '':>7} {np.mean(recalls):>9.3f} "
+                  f"{percentiles(times)} {read_mb:>8.1f} {disk_mb(path):>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--storage", help="Persisted index directory to benchmark instead of synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rescore", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Shortlist sizes to try, as multiples of k.")
+    parser.add_argument("--query-noise", type=float, default=1.0,
+                        help="Norm of the noise added to each (unit-length) query row.")
+    parser.add_argument("--dir", help="Where to write the stores; a temporary directory by default.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.storage:
+        corpora = [np.load(os.path.join(args.storage, VECTORS_FNAME), mmap_mode='r')]
+    else:
+        corpora = (synthetic(n, args.dim, max(8, n // 500), rng) for n in args.sizes)
+
+    root = args.dir or tempfile.mkdtemp()
+    print(f"{'rows':>9} {'codes':>8} {'rescore':>7} {f'recall@{args.k}':>9} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'read MB':>8} {'disk MB':>8}")
+    for matrix in corpora:
+        picks = rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)
+        dim = matrix.shape[1]
+        noise = rng.standard_normal((len(picks), dim)).astype(np.float32) * (args.query_noise / np.sqrt(dim))
+        queries = normalize(np.asarray(matrix[np.sort(picks)]) + noise)
+        run(matrix, queries, args.k, args.rescore, root)
+
+
+if __name__ == "__main__":
+    main()
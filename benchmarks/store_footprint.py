@@ -0,0 +1,95 @@
+"""Load time and resident memory of a local store, by docstore format and corpus size.
+
+Builds synthetic stores of --sizes chunks with the SQLite docstore and with
+the docstore.json StorageContext wrote before it, then loads each in a
+fresh process and reports seconds to load, peak RSS (Linux), and the time
+to fetch the text of the top --k nodes for a query.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from llama_index.core import Settings
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.vector_stores.types import VectorStoreQuery
+Settings.embed_model = MockEmbedding(embed_dim={dim})
+from local_store import load_index
+start = time.perf_counter()
+index = load_index({path!r})
+loaded = time.perf_counter() - start
+query = VectorStoreQuery(query_embedding=[1.0] * {dim}, similarity_top_k={k})
+start = time.perf_counter()
+ids = index.vector_store.query(query).ids
+nodes = index.docstore.get_nodes(ids)
+fetched = time.perf_counter() - start
+# Peak RSS of this process alone; ru_maxrss would carry over the parent's across exec
+peak_kb = next(int(line.split()[1]) for line in open("/proc/self/status") if line.startswith("VmHWM"))
+print(json.dumps({{"load_s": loaded, "rss_mb": peak_kb / 1024, "fetch_ms": fetched * 1000, "nodes": len(nodes)}}))
+"""
+
+
+def build(path: str, n: int, dim: int, chars: int, legacy: bool, rng: np.random.Generator):
+    from llama_index.core import Settings, StorageContext, VectorStoreIndex
+    from llama_index.core.embeddings import MockEmbedding
+    from llama_index.core.schema import TextNode
+
+    from docstore import SQLiteDocumentStore
+    from vector_store import MmapVectorStore
+
+    Settings.embed_model = MockEmbedding(embed_dim=dim)
+    docstore = None if legacy else SQLiteDocumentStore(path)
+    storage_context = StorageContext.from_defaults(vector_store=MmapVectorStore(), docstore=docstore)
+    index = VectorStoreIndex(nodes=[], storage_context=storage_context)
+    words = np.array("justice reinvestment probation parole revocation recidivism county state prison "
+                     "treatment behavioral health supervision sentencing reform data".split())
+    for start in range(0, n, 5000):
+        batch = min(5000, n - start)
+        vectors = rng.standard_normal((batch, dim)).astype(np.float32)
+        index.insert_nodes([
+            TextNode(text=" ".join(rng.choice(words, chars // 8)), embedding=vectors[i].tolist(),
+                     metadata={"file_name": f"report{(start + i) // 40}.pdf", "page_label": str(i % 40)})
+            for i in range(batch)])
+    storage_context.persist(persist_dir=path)
+
+
+def probe(path: str, dim: int, k: int) -> dict:
+    result = subprocess.run([sys.executable, "-c", PROBE.format(root=ROOT, path=path, dim=dim, k=k)],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--dim", type=int, default=256, help="Vector width; vectors are memory-mapped either way.")
+    parser.add_argument("--chars", type=int, default=2000, help="Approximate characters of text per chunk.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dir", help="Where to build the stores; a temporary directory by default.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    root = args.dir or tempfile.mkdtemp()
+    print(f"{'chunks':>9} {'docstore':>9} {'load s':>8} {'RSS MB':>8} {'top-k fetch ms':>15}")
+    for n in args.sizes:
+        for legacy in (True, False):
+            path = os.path.join(root, f"{n}-{'json' if legacy else 'sqlite'}")
+            if not os.path.exists(path):
+                build(path, n, args.dim, args.chars, legacy, rng)
+            result = probe(path, args.dim, args.k)
+            print(f"{n:>9} {'json' if legacy else 'sqlite':>9} {result['load_s']:>8.2f} {result['rss_mb']:>8.0f} "
+                  f"{result['fetch_ms']:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+from llama_index.core import Settings
+from llama_index.embeddings.openai import OpenAIEmbedding
+from crawler import Crawler, Manifest, parse_listing, parse_publication
+from docstore import LEGACY_FNAME, SQLiteDocumentStore
+from embedding_cache import CachedEmbedding
+from embed_scheduler import EmbeddingScheduler
+from frontier import Frontier
+from keyword_index import KeywordIndex
+from local_store import file_hash, file_metadata, indexed_files, list_files, load_index, new_index, parse_file
+from metadata_index import MetadataIndex, annotate
+from parse_cache import ParseCache
+from pipeline import Pipeline, Stage
+from telemetry import start_exporter
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import dotenv
+import os
+import threading
+
+dotenv.load_dotenv()
+
+# Same model and chunking as create-local-store.py, so both build the same index
+Settings.embed_model = CachedEmbedding(OpenAIEmbedding(
+    model="text-embedding-ada-002",
+    api_key=os.getenv("CHATGPT_API_KEY"),
+    max_retries=0
+))
+
+Settings.chunk_size = 512
+Settings.chunk_overlap = 50
+
+
+def discover(root_url: str, frontier: Frontier, crawler: Crawler, out: str, full: bool = False):
+    """Yield ("file" | "download" | "publication", name or url) work items as they are found.
+
+    Files already in `out` come first, so anything an earlier pull-files.py
+    run downloaded but no build indexed starts parsing at once, then links
+    an interrupted crawl left pending, then publications from a walk of the
+    listing pages. Unless `full`, the walk stops at the first page that
+    holds no publication not seen before.
+    """
+    for name in list_files(out):
+        yield "file", name
+    for url in frontier.pending('download'):
+        yield "download", url
+    for url in (frontier.urls('publication') if full else frontier.pending('publication')):
+        yield "publication", url
+
+    page = 1
+    while True:
+        url = root_url + str(page) + '/'
+        page += 1
+        frontier.add([url], 'listing')
+        res = crawler.get(url, accept=(200, 404))
+        if res is None:
+            frontier.mark(url, 'failed')
+            return
+        frontier.mark(url, 'done')
+        links = parse_listing(res.content) if res.status_code == 200 else []
+        if not links:
+            # Past the last listing page
+            frontier.set_meta("listing_complete", "1")
+            return
+        new = [link for link in links if frontier.state(link) is None]
+        frontier.add(links, 'publication', parent=url)
+        for link in links if full else new:
+            yield "publication", link
+        if not new and not full:
+            # Incremental run reached publications we have already seen
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Crawl publications and index their PDFs as they arrive, instead of running "
+                    "pull-files.py and then create-local-store.py.")
+    parser.add_argument("--root-url", default="https://csgjusticecenter.org/publications/page/",
+                        help="Listing page prefix; point at a local fixture server for testing.")
+    parser.add_argument("--out", default="downloads", help="Directory to save PDFs into.")
+    parser.add_argument("--frontier", default="crawl.db", help="SQLite file recording crawl progress.")
+    parser.add_argument("--persist-dir", default="./storage")
+    parser.add_argument("--collection", default=None,
+                        help="Collection recorded on new chunks for scoping searches; defaults to --out's name.")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-walk every listing and publication page and re-check every download.")
+    parser.add_argument("--per-host", type=int, default=4, help="Concurrent requests allowed per host.")
+    parser.add_argument("--publication-workers", type=int, default=4, help="Publication pages fetched at once.")
+    parser.add_argument("--download-workers", type=int, default=4, help="PDFs downloaded at once.")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1, help="Processes parsing PDFs.")
+    parser.add_argument("--chunk-workers", type=int, default=1, help="Threads splitting pages into chunks.")
+    parser.add_argument("--embed-workers", type=int, default=2,
+                        help="Files embedded at once; each keeps up to --embed-concurrency requests in flight.")
+    parser.add_argument("--embed-concurrency", type=int, default=8,
+                        help="Maximum embedding requests in flight per embedding worker.")
+    parser.add_argument("--embed-batch-tokens", type=int, default=8000,
+                        help="Token budget of each embedding request.")
+    parser.add_argument("--queue-size", type=int, default=8,
+                        help="Items each stage may have waiting before the stage feeding it blocks.")
+    parser.add_argument("--persist-every", type=int, default=50,
+                        help="Persist the index after this many indexed files, so an interrupted run keeps "
+                             "them; each persist rewrites the vector file. 0 persists only at the end.")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress lines.")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    # Start every parsing process now, before any thread exists, so forking them is safe
+    pool = ProcessPoolExecutor(max_workers=args.parse_workers)
+    list(pool.map(abs, range(args.parse_workers)))
+
+    start_exporter()
+    os.makedirs(args.out, exist_ok=True)
+    crawler = Crawler(workers=args.publication_workers + args.download_workers, per_host=args.per_host,
+                      verbose=args.verbose)
+    frontier = Frontier(args.frontier)
+    manifest = Manifest(args.out)
+    parse_cache = ParseCache()
+    scheduler = EmbeddingScheduler(max_concurrency=args.embed_concurrency,
+                                   max_batch_tokens=args.embed_batch_tokens)
+
+    if not SQLiteDocumentStore.exists(args.persist_dir) \
+            and os.path.exists(os.path.join(args.persist_dir, LEGACY_FNAME)):
+        SQLiteDocumentStore.migrate(args.persist_dir)
+    index = load_index(args.persist_dir)
+    keywords = KeywordIndex(args.persist_dir)
+    metadata = MetadataIndex(args.persist_dir)
+    if index is None:
+        index = new_index(args.persist_dir)
+        keywords.clear()
+        metadata.clear()
+    collection = args.collection or os.path.basename(os.path.abspath(args.out))
+    existing = indexed_files(index)
+    indexed = {name: entry["ref_doc_ids"] for name, entry in existing.items()}
+    hashes = {name: entry["hash"] for name, entry in existing.items()}
+    counts = {"unchanged": 0, "indexed": 0, "chunks": 0}
+    seen, seen_lock = set(), threading.Lock()
+
+    def publication(item):
+        kind, url = item
+        if kind != "publication":
+            return [item]
+        res = crawler.get(url)
+        if res is None:
+            frontier.mark(url, 'failed')
+            return []
+        links = parse_publication(res.content)
+        frontier.add(links, 'download', parent=url)
+        frontier.mark(url, 'done')
+        return [("download", link) for link in links]
+
+    def download(item):
+        kind, url = item
+        if kind != "download":
+            return [item]
+        filename = crawler.download(url, args.out, manifest)
+        frontier.mark(url, 'done' if filename else 'failed')
+        return [("file", filename)] if filename else []
+
+
+    def parse(item):
+        name = item[1]
+        path = os.path.join(args.out, name)
+        digest = file_hash(path)
+        with seen_lock:
+            # The same file can arrive from disk, a resumed download and the crawl
+            if (name, digest) in seen:
+                return []
+            seen.add((name, digest))
+            if hashes.get(name) == digest:
+                counts["unchanged"] += 1
+                return []
+        docs = parse_cache.get(digest, file_metadata(path, digest))
+        if docs is None:
+            docs = pool.submit(parse_file, path, digest).result()
+            parse_cache.put(digest, docs)
+        return [(name, annotate(docs, collection, manifest.sources()))]
+
+    def chunk(item):
+        name, docs = item
+        return [(name, Settings.node_parser.get_nodes_from_documents(docs))]
+
+    # Every embedding worker submits to this one loop, since the async client is tied to the loop it was used on
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    def embed(item):
+        asyncio.run_coroutine_threadsafe(scheduler.aembed_nodes(item[1]), loop).result()
+        return [item]
+
+    def persist():
+        index.storage_context.persist(persist_dir=args.persist_dir)
+        # Keyword rows and metadata postings become visible with the chunks they index, never before
+        keywords.commit()
+        metadata.commit()
+
+    def insert(item):
+        name, nodes = item
+        # Changed files replace what an earlier build (or an earlier copy in this run) indexed
+        for ref_doc_id in indexed.get(name, []):
+            index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+        keywords.delete(indexed.get(name, []))
+        metadata.delete(indexed.get(name, []))
+        index.insert_nodes(nodes)
+        keywords.add(nodes)
+        metadata.add(nodes)
+        indexed[name] = list(dict.fromkeys(node.ref_doc_id for node in nodes))
+        counts["indexed"] += 1
+        counts["chunks"] += len(nodes)
+        if args.persist_every and counts["indexed"] % args.persist_every == 0:
+            # Downloads are marked done as they land; without this a crash loses every insert since the start
+            persist()
+
+    stages = [
+        Stage("publications", publication, args.publication_workers, args.queue_size),
+        Stage("download", download, args.download_workers, args.queue_size),
+        Stage("parse", parse, args.parse_workers, args.queue_size),
+        Stage("chunk", chunk, args.chunk_workers, args.queue_size),
+        Stage("embed", embed, args.embed_workers, args.queue_size),
+        # The index is not thread-safe, so one writer
+        Stage("insert", insert, 1, args.queue_size),
+    ]
+    pipeline = Pipeline(stages, report_interval=args.report_interval)
+    try:
+        pipeline.run(discover(args.root_url, frontier, crawler, args.out, full=args.full))
+    finally:
+        pool.shutdown()
+        loop.call_soon_threadsafe(loop.stop)
+
+    removed = [name for name in indexed if name not in list_files(args.out)]
+    for name in removed:
+        for ref_doc_id in indexed[name]:
+            index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+        keywords.delete(indexed[name])
+        metadata.delete(indexed[name])
+    persist()
+    keywords.optimize()
+    keywords.close()
+    metadata.close()
+
+    print(pipeline.summary())
+    print(f"Files: {counts['indexed']} indexed ({counts['chunks']} chunks), {counts['unchanged']} unchanged, "
+          f"{len(removed)} removed")
+    for (kind, state), n in sorted(frontier.counts().items()):
+        print(f"{kind:>12} {state:<8} {n}")
+    print(f"Crawl throughput: {crawler.stats.summary()}")
+    print(f"Embedding: {scheduler.summary()}")
+    print(f"Embedding cache: {Settings.embed_model.cache.summary()}")
+    print(f"Parse cache: {parse_cache.summary()}")
+    frontier.close()
+
+
+# Parsing workers re-import this module on spawn-based platforms, so only run as a script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as TransferError
+from urllib3.util.retry import Retry
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:141.0) Gecko/20100101 Firefox/141.0',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'same-origin',
+    'Sec-Fetch-User': '?1',
+    'Priority': 'u=0, i',
+    'Pragma': 'no-cache',
+    'Cache-Control': 'no-cache'
+}
+
+# Downloads are top-level navigations rather than same-site clicks
+DOWNLOAD_HEADERS = {'Sec-Fetch-Site': 'none'}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Downloads are written as each block arrives, so a dropped transfer keeps what it received
+CHUNK_SIZE = 1 << 16
+
+
+def make_session(pool_size: int = 10, retries: int = 5, backoff: float = 0.5) -> requests.Session:
+    """Build a keep-alive session that retries 429/5xx with exponential backoff."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=["GET", "HEAD"],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+class CrawlStats:
+    """Thread-safe page and byte counters for throughput reporting."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.pages = 0
+        self.bytes = 0
+        self.failures = 0
+
+    def record(self, nbytes: int = 0, page: bool = True, failed: bool = False):
+        with self._lock:
+            self.pages += int(page)
+            self.bytes += nbytes
+            self.failures += int(failed)
+
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (f"{self.pages} pages, {self.bytes / 1e6:.1f} MB in {elapsed:.1f}s "
+                f"({self.pages / elapsed:.1f} pages/sec, {self.bytes / elapsed / 1e6:.2f} MB/sec, "
+                f"{self.failures} failed)")
+
+
+class Crawler:
+    """Shared pooled session plus a bounded worker pool with per-host concurrency limits."""
+
+    def __init__(self, workers: int = 8, per_host: int = 4, session: requests.Session | None = None,
+                 timeout: float = 30, verbose: bool = False):
+        self.workers = workers
+        self.per_host = per_host
+        self.session = session or make_session(pool_size=max(workers, per_host))
+        self.timeout = timeout
+        self.verbose = verbose
+        self.stats = CrawlStats()
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self._hosts[host]
+
+    def get(self, url: str, accept: tuple = (200,), **kwargs) -> requests.Response | None:
+        """GET a page under its host limit; returns None unless the status is in accept."""
+        if self.verbose:
+            print(f"Fetching {url}...")
+        kwargs.setdefault("timeout", self.timeout)
+        with self._host_slot(url):
+            try:
+                res = self.session.get(url, **kwargs)
+            except requests.RequestException as e:
+                print(f"Failed to fetch {url}: {e}")
+                self.stats.record(failed=True)
+                return None
+        if res.status_code not in accept:
+            print(f"Failed to fetch {url}, status code: {res.status_code}")
+            self.stats.record(failed=True)
+            return None
+        res.encoding = 'utf-8'
+        self.stats.record(len(res.content))
+        return res
+
+    def download(self, url: str, path: str, manifest: "Manifest") -> str | None:
+        """Stream a file to disk, resuming partial transfers and skipping unchanged ones.
+
+        Returns the stored file name, or None if the download failed.
+        """
+        entry = manifest.get(url)
+        headers = dict(DOWNLOAD_HEADERS)
+        if entry and os.path.exists(os.path.join(path, entry["file"])):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        # Partial files are hidden so the index builders never pick them up
+        part = os.path.join(path, "." + hashlib.sha1(url.encode()).hexdigest() + ".part")
+        partial = manifest.get_partial(url)
+        offset = os.path.getsize(part) if os.path.exists(part) and partial else 0
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            validator = partial.get("etag") or partial.get("last_modified")
+            if validator:
+                headers["If-Range"] = validator
+
+        if self.verbose:
+            print(f"Downloading {url}...")
+        restart = False
+        with self._host_slot(url):
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as res:
+                    if res.status_code == 304:
+                        self.stats.record()
+                        print(f"Unchanged: {entry['file']}")
+                        return entry["file"]
+                    if res.status_code == 416:
+                        restart = True
+                    elif res.status_code not in (200, 206):
+                        print(f"Failed to download {url}, status code: {res.status_code}")
+                        self.stats.record(failed=True)
+                        return None
+                    else:
+                        validators = {"etag": res.headers.get("ETag"),
+                                      "last_modified": res.headers.get("Last-Modified")}
+                        nbytes, sha = self._stream(res, part, validators, url, manifest)
+            except (requests.RequestException, TransferError) as e:
+                # Keep the partial file so the next run resumes from it
+                print(f"Failed to download {url}: {e}")
+                self.stats.record(failed=True)
+                return None
+
+        if restart:
+            # Our partial file no longer matches the remote one
+            os.remove(part)
+            manifest.clear_partial(url)
+            return self.download(url, path, manifest)
+
+        self.stats.record(nbytes)
+        filename = manifest.store(url, part, path, sha.hexdigest(), validators)
+        print(f"Downloaded: {filename}")
+        return filename
+
+    def _stream(self, res: requests.Response, part: str, validators: dict, url: str, manifest: "Manifest"):
+        sha = hashlib.sha256()
+        if res.status_code == 206:
+            with open(part, 'rb') as file:
+                for block in iter(lambda: file.read(CHUNK_SIZE), b""):
+                    sha.update(block)
+            mode = 'ab'
+        else:
+            mode = 'wb'
+        manifest.set_partial(url, validators)
+
+        nbytes = 0
+        with open(part, mode) as file:
+            # read1 returns what has arrived instead of waiting for a whole block
+            while block := res.raw.read1(CHUNK_SIZE, decode_content=True):
+                file.write(block)
+                file.flush()
+                sha.update(block)
+                nbytes += len(block)
+        return nbytes, sha
+
+    def map(self, fn, items):
+        """Apply fn to every item on the worker pool, preserving input order."""
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(fn, items))
+
+
+def parse_listing(html: bytes) -> list:
+    """Publication page links ("Read More" buttons) on a listing page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    links = soup.find_all('a', class_='button')
+    return [link.get('href') for link in links if link.get('href') and link.text.strip() == "Read More"]
+
+
+def parse_publication(html: bytes) -> list:
+    """Download links ("Download" buttons) on a publication page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    links = soup.find_all('a', class_='button')
+    return [link.get('href') for link in links if link.get('href') and link.text.strip() == "Download"]
+
+
+class Manifest:
+    """Per-URL download validators and content hashes, persisted next to the downloads.
+
+    Files are stored once per content hash, so the same report published under
+    two URLs is only kept (and indexed) once.
+    """
+
+    def __init__(self, path: str, filename: str = ".manifest.json"):
+        self.path = os.path.join(path, filename)
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+        else:
+            data = {}
+        self.urls = data.get("urls", {})
+        self.hashes = data.get("hashes", {})
+        self.partials = data.get("partials", {})
+
+    def get(self, url: str) -> dict | None:
+        with self._lock:
+            return self.urls.get(url)
+
+    def get_partial(self, url: str) -> dict | None:
+        with self._lock:
+            return self.partials.get(url)
+
+    def set_partial(self, url: str, validators: dict):
+        with self._lock:
+            self.partials[url] = validators
+            self._save()
+
+    def clear_partial(self, url: str):
+        with self._lock:
+            self.partials.pop(url, None)
+            self._save()
+
+    def store(self, url: str, part: str, path: str, sha256: str, validators: dict) -> str:
+        """Move a finished download into place, deduplicating by content hash."""
+        with self._lock:
+            self.partials.pop(url, None)
+            existing = self.hashes.get(sha256)
+            if existing and os.path.exists(os.path.join(path, existing)):
+                os.remove(part)
+                filename = existing
+            else:
+                filename = url.rstrip('/').split('/')[-1]
+                owner = self._owner(filename)
+                if owner is not None and owner != url:
+                    # Same file name published under a different URL
+                    stem, ext = os.path.splitext(filename)
+                    filename = f"{stem}-{sha256[:8]}{ext}"
+                os.replace(part, os.path.join(path, filename))
+                self.hashes[sha256] = filename
+
+            previous = self.urls.get(url)
+            self.urls[url] = {"file": filename, "sha256": sha256, **validators}
+            if previous and previous["sha256"] != sha256:
+                self._release(path, previous)
+            self._save()
+            return filename
+
+    def sources(self) -> dict:
+        """file name -> the URL it was (last) downloaded from."""
+        with self._lock:
+            return {entry["file"]: url for url, entry in self.urls.items()}
+
+    def _owner(self, filename: str) -> str | None:
+        for url, entry in self.urls.items():
+            if entry["file"] == filename:
+                return url
+        return None
+
+    def _release(self, path: str, entry: dict):
+        # Drop a superseded file once no URL references its content any more
+        if any(e["sha256"] == entry["sha256"] for e in self.urls.values()):
+            return
+        self.hashes.pop(entry["sha256"], None)
+        if not any(e["file"] == entry["file"] for e in self.urls.values()):
+            filepath = os.path.join(path, entry["file"])
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"urls": self.urls, "hashes": self.hashes, "partials": self.partials}, f, indent=1)
+        os.replace(tmp, self.path)
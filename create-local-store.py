@@ -1,19 +1,81 @@
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex, Settings
+from llama_index.core import Settings
 from llama_index.embeddings.openai import OpenAIEmbedding
+from embedding_cache import CachedEmbedding
+from embed_scheduler import EmbeddingScheduler
+from local_store import build_index
+from parse_cache import ParseCache
+import argparse
 import dotenv
 import os 
 
 dotenv.load_dotenv()
 
-Settings.embed_model = OpenAIEmbedding(
+# Retries are left to the embedding scheduler so it can see rate limits
+# and adapt its concurrency
+Settings.embed_model = CachedEmbedding(OpenAIEmbedding(
     model="text-embedding-ada-002",
-    api_key=os.getenv("CHATGPT_API_KEY")
-)
+    api_key=os.getenv("CHATGPT_API_KEY"),
+    max_retries=0
+))
 
 Settings.chunk_size = 512
 Settings.chunk_overlap = 50
 
-docs = SimpleDirectoryReader("downloads").load_data()
-index = VectorStoreIndex.from_documents(docs)
+# Parsing workers re-import this module on spawn-based platforms, so only
+# build when run as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or incrementally update the local vector index.")
+    parser.add_argument("--input-dir", default="downloads")
+    parser.add_argument("--persist-dir", default="./storage")
+    parser.add_argument("--full", action="store_true",
+                        help="Rebuild from scratch instead of only embedding new or changed files.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes used to parse PDFs.")
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="Parsed pages to chunk and insert at a time; bounds peak memory.")
+    parser.add_argument("--embed-concurrency", type=int, default=8,
+                        help="Maximum embedding requests in flight.")
+    parser.add_argument("--embed-batch-tokens", type=int, default=8000,
+                        help="Token budget of each embedding request.")
+    parser.add_argument("--ann-nlist", type=int, default=None,
+                        help="Build an IVF approximate-search index with this many lists (0 removes it). "
+                             "See benchmarks/ann_recall.py for choosing a value.")
+    parser.add_argument("--ann-nprobe", type=int, default=8,
+                        help="Lists scanned per query by default when the IVF index is used.")
+    parser.add_argument("--quantize", choices=["int8", "none"], default=None,
+                        help="Search int8 codes and rescore a shortlist at full precision "
+                             "(none removes them). See benchmarks/quantization_recall.py for the trade-off.")
+    parser.add_argument("--rescore", type=int, default=4,
+                        help="Shortlist rescored at full precision, as a multiple of the top k.")
+    parser.add_argument("--chunk-size", type=int, default=Settings.chunk_size,
+                        help="Tokens per chunk. Use with --full, so existing chunks are re-chunked too; "
+                             "parsed text comes from the parse cache, so only chunking and embedding rerun.")
+    parser.add_argument("--chunk-overlap", type=int, default=Settings.chunk_overlap)
+    parser.add_argument("--collection", default=None,
+                        help="Collection recorded on new chunks for scoping searches; "
+                             "defaults to the input directory's name.")
+    parser.add_argument("--no-parse-cache", action="store_true",
+                        help="Parse every file again instead of reading text extracted by earlier builds.")
+    args = parser.parse_args()
+    Settings.chunk_size = args.chunk_size
+    Settings.chunk_overlap = args.chunk_overlap
 
-index.storage_context.persist(persist_dir="./storage")
\ No newline at end of file
+    parse_cache = None if args.no_parse_cache else ParseCache()
+    scheduler = EmbeddingScheduler(max_concurrency=args.embed_concurrency,
+                                   max_batch_tokens=args.embed_batch_tokens)
+    stats = build_index(input_dir=args.input_dir, persist_dir=args.persist_dir, full=args.full,
+                        workers=args.workers, batch_size=args.batch_size, scheduler=scheduler,
+                        ann_nlist=args.ann_nlist, ann_nprobe=args.ann_nprobe,
+                        quantize=args.quantize, rescore=args.rescore, parse_cache=parse_cache,
+                        collection=args.collection)
+    print(f"Files: {stats['added']} added, {stats['changed']} changed, {stats['removed']} removed, "
+          f"{stats['unchanged']} unchanged")
+    print(f"Chunks: {stats['reused_chunks']} reused, {stats['new_chunks']} new ({stats['embedded_chunks']} embedded, "
+          f"{stats['cached_chunks']} from the embedding cache)")
+    print(f"Throughput: {stats['throughput']}")
+    print(f"Keyword index: {stats['keyword_chunks']} chunks, {stats['keyword_seconds']:.2f}s spent indexing")
+    print(f"Metadata index: {stats['metadata_chunks']} chunks")
+    print(f"Embedding: {scheduler.summary()}")
+    print(f"Embedding cache: {Settings.embed_model.cache.summary()}")
+    if parse_cache is not None:
+        print(f"Parse cache: {parse_cache.summary()}")
@@ -1,29 +1,172 @@
+from llama_cloud import ManagedIngestionStatus, PipelineFileCreate
 from llama_cloud_services import LlamaCloudIndex
+from concurrent.futures import ThreadPoolExecutor
+from crawler import Manifest
+from local_store import file_hash
+from metadata_index import file_fields
+import argparse
 import dotenv
-import os 
+import json
+import os
+import threading
+import time
 
 dotenv.load_dotenv()
 
-index = LlamaCloudIndex.create_index(
-    name="csg-docs-2",
-    project_name="Default",
-    organization_id="f76af4a9-a7d3-4e76-8171-9d45e587eac1",
-    api_key=os.getenv("LLAMA_CLOUD_API_KEY"),
-    # embedding_config={
-    #     "type": "OPENAI_EMBEDDING",
-    #     "model_name": "text-embedding-3-small",
-    #     "api_key": os.getenv("CHATGPT_API_KEY")
-    # },
-    transform_config={
-        "chunk_size": 512,
-        "chunk_overlap": 50
-        }
-)
-
-files = os.listdir("downloads")
-
-for file in files:
-    if file.endswith(".pdf"):
+FINISHED = {ManagedIngestionStatus.SUCCESS, ManagedIngestionStatus.PARTIAL_SUCCESS,
+            ManagedIngestionStatus.ERROR, ManagedIngestionStatus.CANCELLED}
+
+
+class UploadManifest:
+    """Resumable record of which files were uploaded to an index and how ingestion went."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.files = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.files = json.load(f)
+
+    def get(self, name: str) -> dict | None:
+        with self._lock:
+            return self.files.get(name)
+
+    def update(self, name: str, **fields):
+        with self._lock:
+            self.files.setdefault(name, {}).update(fields)
+            tmp = self.path + ".tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self.files, f, indent=1)
+            os.replace(tmp, self.path)
+
+
+def upload(index: LlamaCloudIndex, path: str, digest: str, metadata: dict) -> str:
+    """Upload a file and queue it for ingestion without waiting on it.
+
+    metadata is stored on the file, and so on every chunk of it, for app.py to filter on.
+    """
+    with open(path, 'rb') as f:
+        file = index._client.files.upload_file(project_id=index.project.id, upload_file=f)
+    index._client.pipelines.add_files_to_pipeline_api(
+        pipeline_id=index.id,
+        request=[PipelineFileCreate(file_id=file.id, custom_metadata={**metadata, "file_hash": digest})]
+    )
+    return file.id
+
+
+def poll_ingestion(index: LlamaCloudIndex, manifest: UploadManifest, pending: dict, lock: threading.Lock,
+                   uploads_done: threading.Event, interval: float):
+    """Poll ingestion status of uploaded files until every upload has finished ingesting."""
+    while True:
+        with lock:
+            snapshot = dict(pending)
+        if not snapshot and uploads_done.is_set():
+            return
+        for name, file_id in snapshot.items():
+            try:
+                status = index._client.pipelines.get_pipeline_file_status(
+                    pipeline_id=index.id, file_id=file_id).status
+            except Exception as e:
+                print(f"Could not get status for {name}: {e}")
+                continue
+            if status in FINISHED:
+                manifest.update(name, status=status.value)
+                print(f"Ingested {name}: {status.value}")
+                with lock:
+                    pending.pop(name, None)
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload downloaded PDFs to a LlamaCloud index.")
+    parser.add_argument("--index", default="csg-docs-2")
+    parser.add_argument("--input-dir", default="downloads")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent uploads.")
+    parser.add_argument("--poll-interval", type=float, default=5.0,
+                        help="Seconds between ingestion status checks.")
+    args = parser.parse_args()
+
+    # LLAMA_CLOUD_BASE_URL points the client at a local stand-in for testing
+    index = LlamaCloudIndex.create_index(
+        name=args.index,
+        project_name="Default",
+        organization_id="f76af4a9-a7d3-4e76-8171-9d45e587eac1",
+        api_key=os.getenv("LLAMA_CLOUD_API_KEY"),
+        # embedding_config={
+        #     "type": "OPENAI_EMBEDDING",
+        #     "model_name": "text-embedding-3-small",
+        #     "api_key": os.getenv("CHATGPT_API_KEY")
+        # },
+        transform_config={
+            "chunk_size": 512,
+            "chunk_overlap": 50
+            }
+    )
+
+    manifest = UploadManifest(os.path.join(args.input_dir, f".{args.index}.uploads.json"))
+    remote = {f.name: f for f in index._client.pipelines.list_pipeline_files(pipeline_id=index.id)}
+
+    files = sorted(file for file in os.listdir(args.input_dir) if file.endswith(".pdf"))
+    urls = Manifest(args.input_dir).sources()
+    # The index name is the collection, as the app offers each index separately
+    metadata = {file: file_fields(file, args.index, urls.get(file)) for file in files}
+    to_upload = []
+    unfinished = {}
+    for file in files:
+        path = os.path.join(args.input_dir, file)
+        digest = file_hash(path)
+        existing = remote.get(file)
+        if existing is not None:
+            entry = manifest.get(file) or {}
+            remote_hash = (existing.custom_metadata or {}).get("file_hash")
+            if remote_hash is None and entry.get("file_id") == existing.file_id:
+                remote_hash = entry.get("sha256")
+            if remote_hash == digest:
+                if "title" not in (existing.custom_metadata or {}):
+                    # Uploaded before report metadata was recorded; add it so filters can find the file
+                    index._client.pipelines.update_pipeline_file(
+                        pipeline_id=index.id, file_id=existing.file_id,
+                        custom_metadata={**(existing.custom_metadata or {}), **metadata[file], "file_hash": digest})
+                if entry.get("status") == "UPLOADED":
+                    # Uploaded by an interrupted run but never seen to finish ingesting
+                    unfinished[file] = existing.file_id
+                continue
+            # Same name, but different content or (uploaded before hashes were recorded)
+            # content that cannot be checked: replace it once, recording the hash this time
+            print(f"Replacing {file} in index...")
+            index._client.pipelines.delete_pipeline_file(pipeline_id=index.id, file_id=existing.file_id)
+        to_upload.append((file, digest))
+    print(f"{len(files) - len(to_upload)} files already in {args.index}, {len(to_upload)} to upload")
+
+    pending = dict(unfinished)
+    pending_lock = threading.Lock()
+    uploads_done = threading.Event()
+    poller = threading.Thread(target=poll_ingestion, daemon=True,
+                              args=(index, manifest, pending, pending_lock, uploads_done, args.poll_interval))
+    poller.start()
+
+    def add(item):
+        file, digest = item
         print(f"Adding {file} to index...")
-        index.upload_file(file_path=os.path.join("downloads", file), 
-                          wait_for_ingestion=True)
+        try:
+            file_id = upload(index, os.path.join(args.input_dir, file), digest, metadata[file])
+        except Exception as e:
+            print(f"Failed to upload {file}: {e}")
+            return False
+        manifest.update(file, sha256=digest, file_id=file_id, status="UPLOADED")
+        with pending_lock:
+            pending[file] = file_id
+        return True
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        uploaded = sum(pool.map(add, to_upload))
+    uploads_done.set()
+    print(f"Uploaded {uploaded} files in {time.perf_counter() - start:.1f}s; waiting for ingestion...")
+    poller.join()
+    print(f"All uploads ingested in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
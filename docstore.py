@@ -0,0 +1,156 @@
+import json
+import os
+import sqlite3
+import threading
+
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.docstore.utils import json_to_doc
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION, BaseKVStore
+
+DOCSTORE_FNAME = "docstore.db"
+# What StorageContext persisted before this store existed
+LEGACY_FNAME = "docstore.json"
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS kv (
+    collection TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (collection, key)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteKVStore(BaseKVStore):
+    """Key-value store in one SQLite table, read a row at a time.
+
+    Writes stay in an open transaction until `commit`, so processes reading
+    the same file keep seeing the last persisted state while a build runs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.executescript(SCHEMA)
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put_all([(key, val)], collection=collection)
+
+    async def aput(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put(key, val, collection=collection)
+
+    def put_all(self, kv_pairs: list, collection: str = DEFAULT_COLLECTION, batch_size: int = 1) -> None:
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)",
+                                   [(collection, key, json.dumps(val)) for key, val in kv_pairs])
+
+    async def aput_all(self, kv_pairs: list, collection: str = DEFAULT_COLLECTION, batch_size: int = 1) -> None:
+        self.put_all(kv_pairs, collection=collection)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM kv WHERE collection = ? AND key = ?",
+                                     (collection, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def aget(self, key: str, collection: str = DEFAULT_COLLECTION) -> dict | None:
+        return self.get(key, collection=collection)
+
+    def get_many(self, keys: list, collection: str = DEFAULT_COLLECTION) -> dict:
+        """key -> value for those of keys that are present."""
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                found.update(self._conn.execute(
+                    f"SELECT key, value FROM kv WHERE collection = ? AND key IN ({','.join('?' * len(chunk))})",
+                    [collection, *chunk]
+                ).fetchall())
+        return {key: json.loads(value) for key, value in found.items()}
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM kv WHERE collection = ?", (collection,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> dict:
+        return self.get_all(collection=collection)
+
+    def count(self, collection: str = DEFAULT_COLLECTION) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM kv WHERE collection = ?", (collection,)).fetchone()[0]
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM kv WHERE collection = ? AND key = ?",
+                                      (collection, key)).rowcount > 0
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection=collection)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv")
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+
+class SQLiteDocumentStore(KVDocumentStore):
+    """Docstore kept on disk in persist_dir, so node text is read only for the nodes a query returns.
+
+    A query process holds nothing but the connection; `get_nodes` fetches
+    the top k in one statement. Changes made during a build become visible
+    to other processes when the storage context is persisted.
+    """
+
+    def __init__(self, persist_dir: str, namespace: str | None = None):
+        os.makedirs(persist_dir, exist_ok=True)
+        super().__init__(SQLiteKVStore(os.path.join(persist_dir, DOCSTORE_FNAME)), namespace=namespace)
+
+    @classmethod
+    def exists(cls, persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, DOCSTORE_FNAME))
+
+    @classmethod
+    def migrate(cls, persist_dir: str) -> "SQLiteDocumentStore":
+        """Copy a docstore.json left by an older build into a new SQLite docstore and remove it."""
+        store = cls(persist_dir)
+        legacy = SimpleDocumentStore.from_persist_dir(persist_dir)
+        # Copy collections as stored, so ref doc info and hashes come across unchanged
+        for collection in (legacy._node_collection, legacy._ref_doc_collection, legacy._metadata_collection):
+            store._kvstore.put_all(list(legacy._kvstore.get_all(collection).items()), collection=collection)
+        store.persist()
+        return store
+
+    def __len__(self) -> int:
+        return self._kvstore.count(self._node_collection)
+
+    def __bool__(self) -> bool:
+        # As for MmapVectorStore: an empty docstore is still the one to use
+        return True
+
+    def get_nodes(self, node_ids: list, raise_error: bool = True) -> list:
+        found = self._kvstore.get_many(list(node_ids), collection=self._node_collection)
+        if raise_error:
+            missing = [node_id for node_id in node_ids if node_id not in found]
+            if missing:
+                raise ValueError(f"node_id {missing[0]} not found.")
+        return [json_to_doc(found[node_id]) for node_id in node_ids if node_id in found]
+
+    async def aget_nodes(self, node_ids: list, raise_error: bool = True) -> list:
+        return self.get_nodes(node_ids, raise_error=raise_error)
+
+    def clear(self):
+        self._kvstore.clear()
+
+    def persist(self, persist_path: str = DOCSTORE_FNAME, fs=None) -> None:
+        """Commit pending changes; the data is already on disk, so persist_path is ignored."""
+        self._kvstore.commit()
+        legacy_path = os.path.join(os.path.dirname(self._kvstore.path), LEGACY_FNAME)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
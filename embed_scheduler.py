@@ -0,0 +1,141 @@
+import asyncio
+import random
+import time
+
+from llama_index.core import Settings
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import MetadataMode
+
+from embedding_cache import CachedEmbedding, EmbeddingCache
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or "RateLimit" in type(error).__name__
+
+
+def retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+class EmbeddingScheduler:
+    """Embed build-time chunks in token-budgeted batches with several requests in flight.
+
+    Concurrency follows additive-increase/multiplicative-decrease: every
+    rate-limited batch halves it and waits out the backoff, every run of
+    successes raises it by one again. Finished batches are written to the
+    embedding cache as they complete, which doubles as the checkpoint that
+    lets an interrupted build pick up where it stopped.
+    """
+
+    def __init__(self, embed_model: BaseEmbedding | None = None, cache: EmbeddingCache | None = None,
+                 max_batch_tokens: int = 8000, max_batch_size: int = 512, max_concurrency: int = 8,
+                 max_retries: int = 8, base_backoff: float = 1.0):
+        embed_model = embed_model or Settings.embed_model
+        if isinstance(embed_model, CachedEmbedding):
+            cache = cache or embed_model.cache
+            embed_model = embed_model.inner
+        self.embed_model = embed_model
+        self.cache = cache
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.concurrency = max_concurrency
+        self.rate_limited = 0
+        self.checkpointed = 0
+        self.embedded = 0
+
+    def batches(self, texts: list) -> list:
+        """Pack text indices into batches under the token and size budgets."""
+        batches, batch, tokens = [], [], 0
+        for i, text in enumerate(texts):
+            n = len(Settings.tokenizer(text))
+            if batch and (tokens + n > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append(i)
+            tokens += n
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def embed_nodes(self, nodes: list) -> list:
+        """Set .embedding on every node that lacks one; returns the nodes."""
+        return asyncio.run(self.aembed_nodes(nodes))
+
+    async def aembed_nodes(self, nodes: list) -> list:
+        todo = [node for node in nodes if node.embedding is None]
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in todo]
+
+        if self.cache is not None:
+            cached = self.cache.get_many(self.embed_model.model_name, texts)
+            for node, embedding in zip(todo, cached):
+                node.embedding = embedding
+            self.checkpointed += sum(embedding is not None for embedding in cached)
+            texts = [text for text, embedding in zip(texts, cached) if embedding is None]
+            todo = [node for node, embedding in zip(todo, cached) if embedding is None]
+
+        start = time.perf_counter()
+        queue = asyncio.Queue()
+        for batch in self.batches(texts):
+            queue.put_nowait(batch)
+        in_flight = 0
+        streak = 0
+        wakeup = asyncio.Event()
+
+        async def worker():
+            nonlocal in_flight, streak
+            while not queue.empty():
+                # Wait for a slot under the current (adaptive) concurrency limit
+                while in_flight >= self.concurrency:
+                    wakeup.clear()
+                    await wakeup.wait()
+                if queue.empty():
+                    return
+                batch = queue.get_nowait()
+                in_flight += 1
+                try:
+                    embeddings = await self._embed_batch([texts[i] for i in batch])
+                finally:
+                    in_flight -= 1
+                    wakeup.set()
+                for i, embedding in zip(batch, embeddings):
+                    todo[i].embedding = embedding
+                if self.cache is not None:
+                    self.cache.put_many(self.embed_model.model_name, [texts[i] for i in batch], embeddings)
+                self.embedded += len(batch)
+                streak += 1
+                if streak >= self.concurrency and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    streak = 0
+
+        await asyncio.gather(*(worker() for _ in range(self.max_concurrency)))
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        if texts:
+            print(f"Embedded {len(texts)} chunks in {elapsed:.1f}s ({len(texts) / elapsed:.1f} chunks/sec, "
+                  f"concurrency {self.concurrency}, {self.rate_limited} rate-limited)")
+        return nodes
+
+    async def _embed_batch(self, texts: list) -> list:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.embed_model._aget_text_embeddings(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                if is_rate_limited(e):
+                    self.rate_limited += 1
+                    self.concurrency = max(1, self.concurrency // 2)
+                delay = retry_after(e) or self.base_backoff * 2 ** attempt * (0.5 + random.random())
+                print(f"Embedding batch failed ({type(e).__name__}); retrying in {delay:.1f}s "
+                      f"at concurrency {self.concurrency}")
+                await asyncio.sleep(delay)
+
+    def summary(self) -> str:
+        return (f"{self.embedded} chunks embedded, {self.checkpointed} restored from checkpoint, "
+                f"{self.rate_limited} rate-limited requests")
@@ -0,0 +1,250 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    dim INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+# Reads write back when entries were last used once this many are pending, or this many seconds have passed
+TOUCH_BATCH = 1000
+TOUCH_INTERVAL = 60.0
+
+
+class EmbeddingCache:
+    """Content-addressed embedding store shared by index builds and queries.
+
+    Vectors are appended as raw float32 to `vectors.f32`; `index.db` maps
+    sha256(model, text) to an offset. When the vector file grows past
+    max_bytes, the least recently used entries are compacted away.
+
+    Lookups only read the database; when each entry was last used is kept
+    in memory and written back in batches, with the next `put_many` or at
+    least every TOUCH_INTERVAL seconds.
+    """
+
+    def __init__(self, path: str = os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache"),
+                 max_bytes: int = 2 * 1024 ** 3):
+        os.makedirs(path, exist_ok=True)
+        self.data_path = os.path.join(path, "vectors.f32")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._touched_at = time.monotonic()
+        # Autocommit mode so writers can take the database lock explicitly;
+        # it also serialises appends from concurrent processes. The default
+        # rollback journal (not WAL) lets a compaction shut readers out
+        self._conn = sqlite3.connect(os.path.join(path, "index.db"), check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.executescript(SCHEMA)
+        open(self.data_path, 'ab').close()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+    def get_many(self, model: str, texts: list) -> list:
+        """Cached embeddings for texts, with None where there is no entry."""
+        keys = [self.key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            # A read transaction, so a compaction cannot move the vectors between the lookup and the reads
+            self._conn.execute("BEGIN")
+            try:
+                rows = []
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    rows += self._conn.execute(
+                        f"SELECT key, offset, dim FROM entries WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                with open(self.data_path, 'rb') as data:
+                    for key, offset, dim in rows:
+                        found[key] = np.frombuffer(os.pread(data.fileno(), dim * 4, offset), dtype=np.float32)
+            finally:
+                self._conn.execute("COMMIT")
+            self._touched.update(dict.fromkeys(found, time.time()))
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            if len(self._touched) >= TOUCH_BATCH or time.monotonic() - self._touched_at >= TOUCH_INTERVAL:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._write_touched()
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        return [found[key].tolist() if key in found else None for key in keys]
+
+    def put_many(self, model: str, texts: list, embeddings: list):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = []
+                with open(self.data_path, 'ab') as data:
+                    offset = data.seek(0, os.SEEK_END)
+                    for text, embedding in zip(texts, embeddings):
+                        vector = np.asarray(embedding, dtype=np.float32)
+                        data.write(vector.tobytes())
+                        rows.append((self.key(model, text), offset, len(vector), now))
+                        offset += vector.nbytes
+                # Pending reads first, so entries put again keep their newer time
+                self._write_touched()
+                self._conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            if offset <= self.max_bytes:
+                return
+            # Exclusive, so no reader holds offsets into the file being replaced
+            self._conn.execute("BEGIN EXCLUSIVE")
+            try:
+                # Another process may have compacted while this one waited
+                if os.path.getsize(self.data_path) > self.max_bytes:
+                    self._compact()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _write_touched(self):
+        """Record pending last-used times; the caller holds the write transaction."""
+        touched, self._touched = self._touched, {}
+        self._touched_at = time.monotonic()
+        self._conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                               [(used, key) for key, used in touched.items()])
+
+    def _compact(self):
+        # Keep the most recently used entries that fit in 80% of the budget
+        budget = int(self.max_bytes * 0.8)
+        keep, size = [], 0
+        for key, offset, dim, last_used in self._conn.execute(
+                "SELECT key, offset, dim, last_used FROM entries ORDER BY last_used DESC"):
+            if size + dim * 4 > budget:
+                break
+            keep.append((key, offset, dim, last_used))
+            size += dim * 4
+
+        tmp = self.data_path + ".tmp"
+        rows = []
+        with open(self.data_path, 'rb') as src, open(tmp, 'wb') as dst:
+            for key, offset, dim, last_used in keep:
+                rows.append((key, dst.tell(), dim, last_used))
+                dst.write(os.pread(src.fileno(), dim * 4, offset))
+        self._conn.execute("DELETE FROM entries")
+        self._conn.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)", rows)
+        os.replace(tmp, self.data_path)
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({rate:.0%} hit rate)"
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Wraps an embedding model so repeated texts skip the embedding round-trip."""
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache: EmbeddingCache | None = None, **kwargs):
+        super().__init__(model_name=embed_model.model_name, embed_batch_size=embed_model.embed_batch_size,
+                         **kwargs)
+        self._inner = embed_model
+        self._cache = cache or EmbeddingCache()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    def _lookup(self, namespace: str, texts: list) -> tuple:
+        cached = self._cache.get_many(namespace, texts)
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        return cached, missing
+
+    def _store(self, namespace: str, texts: list, cached: list, missing: list, embeddings: list) -> list:
+        self._cache.put_many(namespace, [texts[i] for i in missing], embeddings)
+        for i, embedding in zip(missing, embeddings):
+            cached[i] = embedding
+        return cached
+
+    # Query embeddings get their own namespace since some models embed
+    # queries and documents differently
+    def _query_namespace(self) -> str:
+        return f"{self.model_name}#query"
+
+    def _get_query_embedding(self, query: str) -> list:
+        cached, missing = self._lookup(self._query_namespace(), [query])
+        if not missing:
+            return cached[0]
+        embedding = self._inner._get_query_embedding(query)
+        return self._store(self._query_namespace(), [query], cached, missing, [embedding])[0]
+
+    async def _aget_query_embedding(self, query: str) -> list:
+        cached, missing = self._lookup(self._query_namespace(), [query])
+        if not missing:
+            return cached[0]
+        embedding = await self._inner._aget_query_embedding(query)
+        return self._store(self._query_namespace(), [query], cached, missing, [embedding])[0]
+
+    def get_query_embedding_batch(self, queries: list) -> list:
+        """Query embeddings for many queries, with the uncached ones embedded in batches.
+
+        Only models that embed queries like documents (ada-002 does) can be
+        batched through the text endpoint; others get one request per query.
+        """
+        unique = list(dict.fromkeys(queries))
+        cached, missing = self._lookup(self._query_namespace(), unique)
+        if missing:
+            texts = [unique[i] for i in missing]
+            if getattr(self._inner, "_query_engine", None) == getattr(self._inner, "_text_engine", False):
+                embeddings = []
+                for i in range(0, len(texts), self.embed_batch_size):
+                    embeddings += self._inner._get_text_embeddings(texts[i:i + self.embed_batch_size])
+            else:
+                embeddings = [self._inner._get_query_embedding(text) for text in texts]
+            self._store(self._query_namespace(), unique, cached, missing, embeddings)
+        embedding_of = dict(zip(unique, cached))
+        return [embedding_of[query] for query in queries]
+
+    def _get_text_embedding(self, text: str) -> list:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> list:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: list) -> list:
+        cached, missing = self._lookup(self.model_name, texts)
+        if not missing:
+            return cached
+        embeddings = self._inner._get_text_embeddings([texts[i] for i in missing])
+        return self._store(self.model_name, texts, cached, missing, embeddings)
+
+    async def _aget_text_embeddings(self, texts: list) -> list:
+        cached, missing = self._lookup(self.model_name, texts)
+        if not missing:
+            return cached
+        embeddings = await self._inner._aget_text_embeddings([texts[i] for i in missing])
+        return self._store(self.model_name, texts, cached, missing, embeddings)
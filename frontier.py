@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    parent TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    discovered_at REAL NOT NULL,
+    fetched_at REAL
+);
+CREATE INDEX IF NOT EXISTS urls_kind_state ON urls (kind, state);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class Frontier:
+    """SQLite record of listing pages, publication pages and download links.
+
+    Each URL has a kind ('listing', 'publication' or 'download') and a fetch
+    state ('pending', 'done' or 'failed'), so an interrupted crawl resumes
+    where it stopped and incremental runs can tell which publications are new.
+    """
+
+    def __init__(self, path: str = "crawl.db", max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def add(self, urls: list, kind: str, parent: str | None = None) -> int:
+        """Record newly discovered URLs; returns how many were not seen before."""
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO urls (url, kind, parent, discovered_at) VALUES (?, ?, ?, ?)",
+                [(url, kind, parent, now) for url in urls]
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def state(self, url: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM urls WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def pending(self, kind: str) -> list:
+        """URLs of a kind still to fetch, including failures with retries left."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url FROM urls WHERE kind = ? AND (state = 'pending' OR (state = 'failed' AND attempts < ?)) "
+                "ORDER BY discovered_at, rowid",
+                (kind, self.max_attempts)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def urls(self, kind: str) -> list:
+        with self._lock:
+            rows = self._conn.execute("SELECT url FROM urls WHERE kind = ? ORDER BY discovered_at, rowid",
+                                      (kind,)).fetchall()
+        return [row[0] for row in rows]
+
+    def mark(self, url: str, state: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE urls SET state = ?, attempts = attempts + 1, fetched_at = ? WHERE url = ?",
+                (state, time.time(), url)
+            )
+            self._conn.commit()
+
+    def counts(self) -> dict:
+        """(kind, state) -> number of URLs, for progress reporting."""
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, state, COUNT(*) FROM urls GROUP BY kind, state").fetchall()
+        return {(kind, state): n for kind, state, n in rows}
+
+    def get_meta(self, key: str, default: str | None = None) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
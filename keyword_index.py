@@ -0,0 +1,108 @@
+import os
+import re
+import sqlite3
+import threading
+
+KEYWORDS_FNAME = "keywords.db"
+# Words too common in these reports to help find anything
+STOPWORDS = frozenset("""
+a about an and are as at be been by can did do does for from had has have how i in into is it its
+me more of on or our so than that the their them there these they this to was we were what when
+where which who why will with would you your
+""".split())
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+    text, node_id UNINDEXED, ref_doc_id UNINDEXED, tokenize = 'porter unicode61'
+);
+"""
+
+
+def match_expression(query: str) -> str | None:
+    """FTS5 query matching any of the query's terms, with user syntax neutralised."""
+    terms = list(dict.fromkeys(t for t in TOKEN.findall(query.lower()) if t not in STOPWORDS))
+    return " OR ".join(f'"{term}"' for term in terms) or None
+
+
+class KeywordIndex:
+    """BM25 inverted index over chunk text, kept beside the vectors in persist_dir.
+
+    Backed by SQLite FTS5, so postings live on disk, BM25 ranking happens in
+    C, and chunks can be added or removed per document as the local store
+    is updated incrementally. Like the docstore, changes stay in an open
+    transaction until `commit`, which builds call right after persisting,
+    so an interrupted build leaves no rows for chunks that were never stored.
+    """
+
+    def __init__(self, persist_dir: str):
+        os.makedirs(persist_dir, exist_ok=True)
+        self.path = os.path.join(persist_dir, KEYWORDS_FNAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def open(cls, persist_dir: str) -> "KeywordIndex | None":
+        """The keyword index of an existing store, or None if it was built without one."""
+        if not os.path.exists(os.path.join(persist_dir, KEYWORDS_FNAME)):
+            return None
+        return cls(persist_dir)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM chunks").fetchone()[0]
+
+    def add(self, nodes: list):
+        with self._lock:
+            self._conn.executemany("INSERT INTO chunks (text, node_id, ref_doc_id) VALUES (?, ?, ?)",
+                                   [(node.get_content(), node.node_id, node.ref_doc_id) for node in nodes])
+
+    def delete(self, ref_doc_ids: list):
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE ref_doc_id = ?", [(i,) for i in ref_doc_ids])
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def optimize(self):
+        """Merge the index's b-trees after a build so queries touch fewer pages."""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO chunks (chunks) VALUES ('optimize')")
+
+    def search(self, query: str, top_k: int = 10, node_ids: list | None = None) -> list:
+        """(node_id, bm25 score) for the best matches, best first; higher is better.
+
+        Given node_ids, only those chunks can match.
+        """
+        expression = match_expression(query)
+        if expression is None or node_ids == []:
+            return []
+        with self._lock:
+            if node_ids is None:
+                rows = self._conn.execute(
+                    "SELECT node_id, bm25(chunks) AS rank FROM chunks WHERE chunks MATCH ? ORDER BY rank LIMIT ?",
+                    (expression, top_k)
+                ).fetchall()
+            else:
+                # A temporary table, since a scope can hold more ids than SQLite allows parameters
+                with self._conn:
+                    self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS allowed (node_id TEXT PRIMARY KEY)")
+                    self._conn.execute("DELETE FROM allowed")
+                    self._conn.executemany("INSERT OR IGNORE INTO allowed VALUES (?)", [(i,) for i in node_ids])
+                rows = self._conn.execute(
+                    "SELECT node_id, bm25(chunks) AS rank FROM chunks WHERE chunks MATCH ? "
+                    "AND node_id IN (SELECT node_id FROM allowed) ORDER BY rank LIMIT ?",
+                    (expression, top_k)
+                ).fetchall()
+        # FTS5 reports BM25 negated so that ascending order is best first
+        return [(node_id, -rank) for node_id, rank in rows]
+
+    def close(self):
+        self._conn.close()
@@ -1,31 +1,44 @@
 import streamlit as st
 from openai import OpenAI
-from llama_index.core import StorageContext, load_index_from_storage, Settings
+from llama_index.core import QueryBundle, Settings
+from llama_index.core.retrievers import VectorIndexRetriever
 from llama_index.embeddings.openai import OpenAIEmbedding
+from embedding_cache import CachedEmbedding
+from local_store import load_index
+from prompting import assemble_prompt
+from retrieval import keyword_ranking, merge_excerpts, mmr_rerank, reciprocal_rank_fusion
+from keyword_index import KeywordIndex
+from metadata_index import MetadataIndex, parse_pages
+from telemetry import Trace, start_exporter
 import os
+import time
 import dotenv
 
 dotenv.load_dotenv()
-Settings.embed_model = OpenAIEmbedding(
+Settings.embed_model = CachedEmbedding(OpenAIEmbedding(
     model="text-embedding-ada-002",
     api_key=os.getenv("CHATGPT_API_KEY")
-)
+))
+
+# Token budget for each chat request, and the share conversation history may use
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 12000))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 3000))
+
+# With diversity reranking on, this many times top_k candidates are retrieved to choose from
+MMR_CANDIDATE_FACTOR = 3
 
 @st.cache_resource
 def initialize_index():
     try:
         # Path to your local storage directory
-        storage_dir = "./storage"  # Adjust this path as needed
+        storage_dir = os.getenv("LOCAL_STORAGE_DIR", "./storage")  # Adjust this path as needed
         
         if not os.path.exists(storage_dir):
             st.error(f"Storage directory '{storage_dir}' not found. Please ensure your index is built and stored in this location.")
             st.stop()
         
-        # Load the storage context
-        storage_context = StorageContext.from_defaults(persist_dir=storage_dir)
-        
-        # Load the index from storage
-        index = load_index_from_storage(storage_context)
+        # Load the index from storage; vectors are memory-mapped rather than parsed
+        index = load_index(storage_dir)
         
         return index
 
@@ -33,16 +46,65 @@ def initialize_index():
         st.error(f"Error loading local index: {e}")
         st.stop()
 
+@st.cache_resource
+def initialize_keyword_index():
+    # None for stores built before keyword search; retrieval is then dense only
+    return KeywordIndex.open(os.getenv("LOCAL_STORAGE_DIR", "./storage"))
+
+@st.cache_resource
+def initialize_metadata_index():
+    # None for stores built before metadata filters; the scope controls are then hidden
+    return MetadataIndex.open(os.getenv("LOCAL_STORAGE_DIR", "./storage"))
+
 @st.cache_resource
 def get_openai_client():
     return OpenAI(api_key=st.secrets['openai_key'])
 
 def retrieve_trusted_content(index, query: str, top_k: int = 5, 
-                             min_similarity: float = 0.6):
-    retriever = index.as_retriever(similarity_top_k=top_k)
-    nodes = retriever.retrieve(query)
-    filtered_nodes = [node for node in nodes if node.score >= min_similarity]
-    print(filtered_nodes)
+                             min_similarity: float = 0.6, trace: Trace | None = None,
+                             keywords: KeywordIndex | None = None, diversity: float = 0.0,
+                             metadata: MetadataIndex | None = None, scope: dict | None = None):
+    trace = trace or Trace("local-app")
+    fetch_k = top_k * MMR_CANDIDATE_FACTOR if diversity > 0 else top_k
+    # Chunks outside the scope are never scored, so they cannot take excerpt slots
+    allowed = None
+    if metadata is not None and scope:
+        with trace.span("filter"):
+            allowed = metadata.match(scope)
+        trace.set(scope_chunks=len(allowed) if allowed is not None else None)
+        if allowed == []:
+            return ["<no_relevant_content>No indexed content matches the selected filters.</no_relevant_content>"]
+    cache = Settings.embed_model.cache
+    hits = cache.hits
+    with trace.span("embed"):
+        embedding = Settings.embed_model.get_query_embedding(query)
+    trace.set(query_embedding_cached=cache.hits > hits)
+
+    # min_similarity is applied inside the vector search
+    # Built directly, since as_retriever would pass every node id in the index as the scope
+    retriever = VectorIndexRetriever(index, similarity_top_k=fetch_k, node_ids=allowed,
+                                     vector_store_kwargs={"min_similarity": min_similarity})
+    with trace.span("search"):
+        filtered_nodes = retriever.retrieve(QueryBundle(query, embedding=embedding))
+    if keywords is not None:
+        # Exact terms (statute numbers, acronyms, state names) that dense search misses
+        with trace.span("keyword"):
+            keyword_nodes = keyword_ranking(index, keywords, query, embedding, fetch_k, node_ids=allowed,
+                                            min_similarity=min_similarity)
+        with trace.span("fuse"):
+            filtered_nodes = reciprocal_rank_fusion([filtered_nodes, keyword_nodes])[:fetch_k]
+        trace.set(keyword_hits=len(keyword_nodes))
+    # Near-duplicate chunks give way to different ones, compared by their stored vectors
+    with trace.span("rerank"):
+        embeddings = None
+        if diversity > 0:
+            embeddings = index.vector_store.get_embeddings([node.node.node_id for node in filtered_nodes])
+        filtered_nodes = mmr_rerank(filtered_nodes, top_k, diversity, embeddings=embeddings)
+    # Neighbouring chunks of one document become one excerpt without the repeated overlap
+    with trace.span("merge"):
+        merged_nodes = merge_excerpts(filtered_nodes)
+    trace.set(retrieved=len(filtered_nodes), merged_excerpts=len(merged_nodes))
+    filtered_nodes = merged_nodes
 
     if not filtered_nodes:
         return ["<no_relevant_content>No sufficiently relevant content found.</no_relevant_content>"]
@@ -50,10 +112,23 @@ def retrieve_trusted_content(index, query: str, top_k: int = 5,
     return [f"<excerpt confidence=\"{node.score:.2f}\" source=\"{node.metadata.get('file_name', node.metadata.get('id', ''))}\">{node.text}</excerpt>" 
             for node in filtered_nodes]
 
-def chat_with_retrieval(query: str, conversation_history: list):
+def chat_with_retrieval(query: str, conversation_history: list, retrieve_n: int = 5,
+                        min_similarity: float = 0.6, diversity: float = 0.0, scope: dict | None = None):
+    trace = Trace("local-app", top_k=retrieve_n, min_similarity=min_similarity, diversity=diversity,
+                  scoped=bool(scope))
     # Get trusted content first
     index = initialize_index()
-    excerpts = retrieve_trusted_content(index=index, query=query)
+    try:
+        with trace.span("retrieve"):
+            excerpts = retrieve_trusted_content(index=index, query=query, top_k=retrieve_n,
+                                                min_similarity=min_similarity, trace=trace,
+                                                keywords=initialize_keyword_index(),
+                                                diversity=diversity,
+                                                metadata=initialize_metadata_index(), scope=scope)
+    except Exception as e:
+        trace.fail(e)
+        raise
+    trace.set(excerpts=sum(excerpt.startswith("<excerpt") for excerpt in excerpts))
     # print(excerpts)
     client = get_openai_client()
     
@@ -71,34 +146,32 @@ def chat_with_retrieval(query: str, conversation_history: list):
     - If the confidence scores are high (0.8+), you can be more definitive in your response
     - Always tell me the name of the document/file that you pulled the excerpts from and if information is coming from multiple documents note it. Include those sources at the bottom of the response. 
     """
-    # Build conversation with retrieved content
-    messages = [{"role": "system", "content": system_message}]
-
-    # Add conversation history
-    messages.extend(conversation_history)
+    # Fit history and excerpts into the prompt budget, best excerpts first
+    prompt_start = time.perf_counter()
+    messages, report = assemble_prompt(system_message, conversation_history, query, excerpts,
+                                       budget=PROMPT_TOKEN_BUDGET, history_budget=HISTORY_TOKEN_BUDGET)
+    trace.record("prompt", time.perf_counter() - prompt_start)
+    trace.set(**report)
 
-    # Create user message with retrieved content
-    user_message = f"""Question: {query}
-
-    Trusted content:
-    {chr(10).join(excerpts)}
-
-    Please answer the question based only on the provided trusted content above."""
-
-    messages.append({"role": "user", "content": user_message})
-
-    # Make the API call
-    response = client.chat.completions.create(
-        model="gpt-4o",  # Changed from gpt-5 to gpt-4o (more commonly available)
-        messages=messages,
-        temperature=0.7,  # Slightly lower temperature for more consistent responses
-        stream=True
-    )
+    # Make the API call; time to first token is measured from here
+    request_start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(
+            model="gpt-4o",  # Changed from gpt-5 to gpt-4o (more commonly available)
+            messages=messages,
+            temperature=0.7,  # Slightly lower temperature for more consistent responses
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+    except Exception as e:
+        trace.fail(e)
+        raise
     
-    return response
+    return trace.wrap_stream(response, start=request_start)
 
 def main():
     st.set_page_config(page_title="Local Document Search", page_icon="🔍", layout="centered")
+    start_exporter()
     st.markdown("# CSG Justice Center: Local *G*uided *A*ggregation of *M*aterials and *B*riefs using *L*arge-Language Models and *E*nhanced *R*ules (Local GAMBLER)🦙")
     
     st.warning('This application is an **experiment**, please use it accordingly and verify any critical information.', icon="⚠️")
@@ -107,6 +180,35 @@ def main():
                 "The system will retrieve relevant content from your local storage. That content is then summarized by the LLM. " \
                 "Keep in mind that the index scope depends on the documents you've indexed.")
    
+    # Set up a slider to trade relevance for variety among excerpts -----------
+    diversity = st.sidebar.slider(
+        "Excerpt Diversity:",
+        min_value=0.0,
+        max_value=1.0,
+        value=0.0,
+        step=0.05,
+        help="Above 0, excerpts are reranked so near-duplicate passages give way to different ones; 0 keeps the plain relevance order. Around 0.3 works well for broad questions."
+    )
+
+    # Set up filters that limit which documents are searched -----------------
+    scope = {}
+    metadata = initialize_metadata_index()
+    if metadata is not None and len(metadata):
+        st.sidebar.subheader("Scope")
+        for field, label in (("collection", "Collections:"), ("year", "Publication Years:"), ("title", "Reports:")):
+            counts = dict(metadata.values(field))
+            if counts:
+                scope[field] = st.sidebar.multiselect(
+                    label,
+                    options=list(counts),
+                    format_func=lambda value, counts=counts: f"{value} ({counts[value]} chunks)",
+                    help="Only search chunks with the selected values; leave empty to search them all."
+                )
+        scope["page"] = parse_pages(st.sidebar.text_input(
+            "Pages:",
+            help="Page labels to search, such as 1-5, 12; leave empty to search every page. Most useful with one report selected."
+        ))
+
     # Initialize the index and OpenAI client
     index = initialize_index()
     client = get_openai_client()
@@ -133,7 +235,8 @@ def main():
             try:
                 # Show a spinner while retrieving and streaming the response
                 with st.spinner("Retrieving trusted content and generating response..."):
-                    response_stream = chat_with_retrieval(prompt, messages[:-1])  # Exclude current message
+                    response_stream = chat_with_retrieval(prompt, messages[:-1],  # Exclude current message
+                                                          diversity=diversity, scope=scope)
 
                     # Stream the response
                     response_placeholder = st.empty()
@@ -0,0 +1,299 @@
+import hashlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from llama_index.core import SimpleDirectoryReader, StorageContext, VectorStoreIndex, load_index_from_storage, Settings
+from llama_index.core.readers.file.base import default_file_metadata_func
+from llama_index.core.storage.index_store.types import DEFAULT_PERSIST_FNAME as INDEX_STORE_FNAME
+
+from crawler import Manifest
+from docstore import LEGACY_FNAME, SQLiteDocumentStore
+from embed_scheduler import EmbeddingScheduler
+from keyword_index import KeywordIndex
+from metadata_index import MetadataIndex, annotate
+from parse_cache import ParseCache
+from vector_store import IDS_FNAME, LEGACY_FNAME as LEGACY_VECTORS_FNAME, VECTORS_FNAME, MmapVectorStore
+
+# Per-file content hash recorded on every document so later builds can tell
+# which files changed without re-parsing them
+HASH_KEY = "file_hash"
+
+
+def file_hash(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def list_files(input_dir: str) -> dict:
+    """file name -> path for every visible file in input_dir."""
+    return {name: os.path.join(input_dir, name) for name in sorted(os.listdir(input_dir))
+            if not name.startswith(".") and os.path.isfile(os.path.join(input_dir, name))}
+
+
+def persisted(persist_dir: str) -> bool:
+    """Whether a build has persisted an index in persist_dir: its index store, vectors and docstore."""
+    def exists(*fnames):
+        return all(os.path.exists(os.path.join(persist_dir, fname)) for fname in fnames)
+
+    has_vectors = exists(VECTORS_FNAME, IDS_FNAME) or exists(LEGACY_VECTORS_FNAME)
+    has_docstore = SQLiteDocumentStore.exists(persist_dir) or exists(LEGACY_FNAME)
+    return exists(INDEX_STORE_FNAME) and has_vectors and has_docstore
+
+
+def load_index(persist_dir: str) -> VectorStoreIndex | None:
+    """The index in persist_dir, or None if there isn't one.
+
+    Vectors are memory-mapped and node text stays in SQLite until a query
+    asks for it. Stores last built before the SQLite docstore are loaded
+    from docstore.json whole, as they used to be, until the next build
+    converts them. A directory that a first build was interrupted in holds
+    a docstore but nothing persisted yet, and has no index.
+    """
+    if not persisted(persist_dir):
+        return None
+    docstore = SQLiteDocumentStore(persist_dir) if SQLiteDocumentStore.exists(persist_dir) else None
+    vector_store = MmapVectorStore.from_persist_dir(persist_dir)
+    storage_context = StorageContext.from_defaults(persist_dir=persist_dir, vector_store=vector_store,
+                                                   docstore=docstore)
+    return load_index_from_storage(storage_context)
+
+
+def new_index(persist_dir: str) -> VectorStoreIndex:
+    docstore = SQLiteDocumentStore(persist_dir)
+    # Emptied inside the build's transaction, so readers keep the old index until persist
+    docstore.clear()
+    storage_context = StorageContext.from_defaults(vector_store=MmapVectorStore(), docstore=docstore)
+    return VectorStoreIndex(nodes=[], storage_context=storage_context)
+
+
+def indexed_files(index: VectorStoreIndex) -> dict:
+    """file name -> {"hash", "ref_doc_ids", "chunks"} for everything already in the index."""
+    files = {}
+    for ref_doc_id, info in index.docstore.get_all_ref_doc_info().items():
+        name = info.metadata.get("file_name")
+        entry = files.setdefault(name, {"hash": info.metadata.get(HASH_KEY), "ref_doc_ids": [], "chunks": 0})
+        entry["ref_doc_ids"].append(ref_doc_id)
+        entry["chunks"] += len(info.node_ids)
+    return files
+
+
+def file_metadata(path: str, digest: str) -> dict:
+    return {**default_file_metadata_func(path), HASH_KEY: digest}
+
+
+def load_documents(paths: list, hashes: dict) -> list:
+    docs = SimpleDirectoryReader(
+        input_files=paths, file_metadata=lambda path: file_metadata(path, hashes[os.path.basename(path)])
+    ).load_data()
+    for doc in docs:
+        doc.excluded_embed_metadata_keys.append(HASH_KEY)
+        doc.excluded_llm_metadata_keys.append(HASH_KEY)
+    return docs
+
+
+def parse_file(path: str, digest: str) -> list:
+    # Runs in a worker process, so it must stay a picklable top-level function
+    return load_documents([path], {os.path.basename(path): digest})
+
+
+def iter_documents(paths: list, hashes: dict, workers: int = os.cpu_count() or 1,
+                   cache: ParseCache | None = None):
+    """Yield each file's documents as soon as they are read from `cache` or a worker has parsed them.
+
+    Only files missing from the cache are parsed, and what they yield is
+    added to it. At most two files per worker are in flight, so memory stays
+    bounded however many files there are.
+    """
+    misses = []
+    for path in paths:
+        digest = hashes[os.path.basename(path)]
+        docs = cache.get(digest, file_metadata(path, digest)) if cache is not None else None
+        if docs is None:
+            misses.append(path)
+        else:
+            yield docs
+
+    for path, docs in _parse_files(misses, hashes, workers):
+        if cache is not None:
+            cache.put(hashes[os.path.basename(path)], docs)
+        yield docs
+
+
+def _parse_files(paths: list, hashes: dict, workers: int):
+    # (path, documents) pairs in completion order
+    if workers <= 1:
+        for path in paths:
+            yield path, load_documents([path], hashes)
+        return
+
+    pending = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        while True:
+            for path in pending:
+                in_flight[pool.submit(parse_file, path, hashes[os.path.basename(path)])] = path
+                if len(in_flight) >= 2 * workers:
+                    break
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield in_flight.pop(future), future.result()
+
+
+class Throughput:
+    """Pages and chunks per second across an index build."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.files = 0
+        self.pages = 0
+        self.chunks = 0
+        self.keyword_seconds = 0.0
+
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (f"{self.files} files, {self.pages} pages, {self.chunks} chunks in {elapsed:.1f}s "
+                f"({self.pages / elapsed:.1f} pages/sec, {self.chunks / elapsed:.1f} chunks/sec)")
+
+
+def insert_documents(index: VectorStoreIndex, docs: list, throughput: Throughput,
+                     scheduler: EmbeddingScheduler | None = None, keywords: KeywordIndex | None = None,
+                     metadata: MetadataIndex | None = None):
+    nodes = Settings.node_parser.get_nodes_from_documents(docs)
+    if scheduler is not None:
+        # Nodes that already carry an embedding are not re-embedded on insert
+        scheduler.embed_nodes(nodes)
+    index.insert_nodes(nodes)
+    if keywords is not None:
+        start = time.perf_counter()
+        keywords.add(nodes)
+        throughput.keyword_seconds += time.perf_counter() - start
+    if metadata is not None:
+        metadata.add(nodes)
+    throughput.pages += len(docs)
+    throughput.chunks += len(nodes)
+    print(f"Indexed {throughput.summary()}")
+
+
+def _embedding_counts(scheduler: EmbeddingScheduler | None = None) -> tuple | None:
+    """(chunks embedded, chunks read from the embedding cache) so far, or None if nothing counts them."""
+    if scheduler is not None:
+        return scheduler.embedded, scheduler.checkpointed
+    # Without a scheduler, inserting embeds through Settings.embed_model
+    cache = getattr(Settings.embed_model, "cache", None)
+    return (cache.misses, cache.hits) if cache is not None else None
+
+
+def build_index(input_dir: str = "downloads", persist_dir: str = "./storage", full: bool = False,
+                workers: int = os.cpu_count() or 1, batch_size: int = 256,
+                scheduler: EmbeddingScheduler | None = None, ann_nlist: int | None = None,
+                ann_nprobe: int = 8, quantize: str | None = None, rescore: int = 4,
+                parse_cache: ParseCache | None = None, collection: str | None = None) -> dict:
+    """Bring the index in persist_dir up to date with the files in input_dir.
+
+    Only new or changed files are parsed and embedded; nodes belonging to
+    changed or removed files are deleted. Files are parsed across `workers`
+    processes and inserted in batches of about `batch_size` pages, embedded
+    through `scheduler` when one is given; files whose text is already in
+    `parse_cache` are read from it instead of parsed. `ann_nlist` adds (or with 0,
+    removes) an IVF index alongside the vectors; None keeps the current
+    setting. `quantize` ("int8" or "none") does the same for
+    compact codes searched before rescoring `rescore` times k rows at full
+    precision. A BM25 keyword index over the same chunks is kept in step,
+    as is a metadata index of each chunk's collection (by default the name
+    of input_dir), publication year, report title, source file and page.
+    Returns counts for reporting.
+    """
+    paths = list_files(input_dir)
+    hashes = {name: file_hash(path) for name, path in paths.items()}
+
+    if not full and not SQLiteDocumentStore.exists(persist_dir) \
+            and os.path.exists(os.path.join(persist_dir, LEGACY_FNAME)):
+        SQLiteDocumentStore.migrate(persist_dir)
+    index = None if full else load_index(persist_dir)
+    existing = indexed_files(index) if index is not None else {}
+
+    unchanged = [name for name in hashes if name in existing and existing[name]["hash"] == hashes[name]]
+    changed = [name for name in hashes if name in existing and existing[name]["hash"] != hashes[name]]
+    added = [name for name in hashes if name not in existing]
+    removed = [name for name in existing if name not in hashes]
+
+    throughput = Throughput()
+    keywords = KeywordIndex(persist_dir)
+    metadata = MetadataIndex(persist_dir)
+    if index is None:
+        index = new_index(persist_dir)
+        keywords.clear()
+        metadata.clear()
+    else:
+        if existing and len(keywords) != len(index.docstore):
+            # Store built before keyword search existed, or whose keywords an interrupted
+            # build once left out of step with it; index what it already holds
+            start = time.perf_counter()
+            keywords.clear()
+            keywords.add(list(index.docstore.docs.values()))
+            throughput.keyword_seconds += time.perf_counter() - start
+        if existing and len(metadata) != len(index.docstore):
+            # Likewise for metadata filters; chunks indexed before them have no year or collection
+            metadata.clear()
+            metadata.add(list(index.docstore.docs.values()))
+    if ann_nlist is not None:
+        index.vector_store.configure_ann(ann_nlist, ann_nprobe)
+    if quantize is not None:
+        index.vector_store.configure_quantization(quantize, rescore)
+    for name in changed + removed:
+        for ref_doc_id in existing[name]["ref_doc_ids"]:
+            index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+        keywords.delete(existing[name]["ref_doc_ids"])
+        metadata.delete(existing[name]["ref_doc_ids"])
+
+    collection = collection or os.path.basename(os.path.abspath(input_dir))
+    urls = Manifest(input_dir).sources()
+    counts_before = _embedding_counts(scheduler)
+    batch = []
+    for docs in iter_documents([paths[name] for name in changed + added], hashes, workers=workers,
+                               cache=parse_cache):
+        throughput.files += 1
+        batch.extend(annotate(docs, collection, urls))
+        if len(batch) >= batch_size:
+            insert_documents(index, batch, throughput, scheduler, keywords, metadata)
+            batch = []
+    if batch:
+        insert_documents(index, batch, throughput, scheduler, keywords, metadata)
+
+    counts_after = _embedding_counts(scheduler)
+    if counts_before is None:
+        embedded, cached = throughput.chunks, 0
+    else:
+        embedded, cached = (after - before for after, before in zip(counts_after, counts_before))
+
+    index.storage_context.persist(persist_dir=persist_dir)
+    # Keyword rows and metadata postings become visible with the chunks they index, never before
+    keywords.commit()
+    metadata.commit()
+    start = time.perf_counter()
+    keywords.optimize()
+    throughput.keyword_seconds += time.perf_counter() - start
+    keyword_chunks = len(keywords)
+    keywords.close()
+    metadata_chunks = len(metadata)
+    metadata.close()
+    return {
+        "added": len(added),
+        "changed": len(changed),
+        "removed": len(removed),
+        "unchanged": len(unchanged),
+        "reused_chunks": sum(existing[name]["chunks"] for name in unchanged),
+        "new_chunks": throughput.chunks,
+        "embedded_chunks": embedded,
+        "cached_chunks": cached,
+        "keyword_chunks": keyword_chunks,
+        "keyword_seconds": throughput.keyword_seconds,
+        "metadata_chunks": metadata_chunks,
+        "throughput": throughput.summary(),
+    }
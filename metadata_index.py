@@ -0,0 +1,166 @@
+import datetime
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+METADATA_FNAME = "metadata.db"
+# Fields chunks can be filtered on, and the node metadata each comes from
+FIELDS = {"collection": "collection", "year": "year", "title": "title", "source": "file_name",
+          "page": "page_label"}
+# Added to every document at ingest; kept out of embedded and LLM text, so
+# adding them does not change any chunk's embedding
+FILE_KEYS = ("title", "year", "collection")
+# WordPress files uploads under /uploads/<year>/<month>/, which dates a report better than its text
+UPLOAD_YEAR = re.compile(r"/uploads/((?:19|20)\d\d)/")
+YEAR = re.compile(r"\b((?:19|20)\d\d)\b")
+# Suffix Manifest adds when two URLs publish different files under one name
+HASH_SUFFIX = re.compile(r"-[0-9a-f]{8}$")
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS postings (
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    ref_doc_id TEXT,
+    PRIMARY KEY (field, value, node_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_ref_doc ON postings (ref_doc_id);
+"""
+
+
+def title_from_file_name(file_name: str) -> str:
+    """A readable report title from a download's file name."""
+    stem = HASH_SUFFIX.sub("", os.path.splitext(file_name)[0])
+    words = [word for word in re.split(r"[\s_\-]+", stem) if word]
+    # Acronyms and names keep their case; all-lowercase slugs are capitalised
+    return " ".join(word if any(c.isupper() for c in word) else word.capitalize() for word in words)
+
+
+def publication_year(url: str | None = None, text: str | None = None) -> str | None:
+    """The upload year in the download URL, or else the year the first page mentions most."""
+    match = UPLOAD_YEAR.search(url or "")
+    if match:
+        return match.group(1)
+    latest = datetime.date.today().year + 1
+    years = Counter(year for year in YEAR.findall(text or "") if int(year) <= latest)
+    return years.most_common(1)[0][0] if years else None
+
+
+def file_fields(file_name: str, collection: str | None = None, url: str | None = None,
+                text: str | None = None) -> dict:
+    """The FILE_KEYS metadata of one file, leaving out what cannot be told."""
+    fields = {"title": title_from_file_name(file_name), "year": publication_year(url, text),
+              "collection": collection}
+    return {key: value for key, value in fields.items() if value}
+
+
+def annotate(docs: list, collection: str | None = None, urls: dict | None = None) -> list:
+    """Add title, year and collection to the documents (pages, in order) of one file.
+
+    urls maps file names to the URL each was downloaded from, as Manifest.sources returns.
+    """
+    if not docs:
+        return docs
+    file_name = docs[0].metadata.get("file_name", "")
+    fields = file_fields(file_name, collection, (urls or {}).get(file_name), docs[0].text)
+    for doc in docs:
+        doc.metadata.update(fields)
+        for excluded in (doc.excluded_embed_metadata_keys, doc.excluded_llm_metadata_keys):
+            excluded.extend(key for key in FILE_KEYS if key not in excluded)
+    return docs
+
+
+def node_fields(metadata: dict) -> dict:
+    """field -> value of a chunk, for the fields its metadata has."""
+    values = {field: metadata.get(key) for field, key in FIELDS.items()}
+    if not values["title"] and values["source"]:
+        # Chunks ingested before titles were recorded
+        values["title"] = title_from_file_name(values["source"])
+    return {field: str(value) for field, value in values.items() if value not in (None, "")}
+
+
+def parse_pages(spec: str) -> list:
+    """Page labels from a spec like "1-5, 9, iv"; numeric ranges are expanded."""
+    pages = []
+    for part in (part.strip() for part in spec.split(",")):
+        start, _, end = part.partition("-")
+        if start.strip().isdigit() and end.strip().isdigit():
+            pages += [str(page) for page in range(int(start), int(end) + 1)]
+        elif part:
+            pages.append(part)
+    return pages
+
+
+class MetadataIndex:
+    """Inverted index from (field, value) to chunk node ids, kept beside the vectors in persist_dir.
+
+    `match` turns filters on collection, year, report title, source file or
+    page into the node ids allowed through, which the vector store and the
+    keyword index then search instead of every chunk. Postings are added
+    and removed per document as the local store is updated incrementally,
+    and committed with the docstore, as the keyword index is.
+    """
+
+    def __init__(self, persist_dir: str):
+        os.makedirs(persist_dir, exist_ok=True)
+        self.path = os.path.join(persist_dir, METADATA_FNAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def open(cls, persist_dir: str) -> "MetadataIndex | None":
+        """The metadata index of an existing store, or None if it was built without one."""
+        if not os.path.exists(os.path.join(persist_dir, METADATA_FNAME)):
+            return None
+        return cls(persist_dir)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM postings WHERE field = 'source'").fetchone()[0]
+
+    def add(self, nodes: list):
+        rows = [(field, value, node.node_id, node.ref_doc_id)
+                for node in nodes for field, value in node_fields(node.metadata).items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?, ?)", rows)
+
+    def delete(self, ref_doc_ids: list):
+        with self._lock:
+            self._conn.executemany("DELETE FROM postings WHERE ref_doc_id = ?", [(i,) for i in ref_doc_ids])
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def values(self, field: str) -> list:
+        """(value, chunk count) for every value of field, in order of value."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT value, count(*) FROM postings WHERE field = ? GROUP BY value ORDER BY value", (field,)
+            ).fetchall()
+
+    def match(self, filters: dict) -> list | None:
+        """Node ids having any of the given values in every filtered field; None when nothing is filtered."""
+        filters = {field: list(values) for field, values in filters.items() if values}
+        if not filters:
+            return None
+        unknown = set(filters) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown metadata field {sorted(unknown)[0]!r}; expected one of {', '.join(FIELDS)}")
+        clauses, params = [], []
+        for field, values in filters.items():
+            clauses.append(f"SELECT node_id FROM postings WHERE field = ? AND value IN ({','.join('?' * len(values))})")
+            params += [field, *map(str, values)]
+        with self._lock:
+            return [row[0] for row in self._conn.execute(" INTERSECT ".join(clauses), params)]
+
+    def close(self):
+        self._conn.close()
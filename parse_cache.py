@@ -0,0 +1,62 @@
+import gzip
+import json
+import os
+
+from llama_index.core import Document
+
+# Per-page fields written by the PDF reader; everything else in a document's
+# metadata describes the file and is recomputed on load, so a renamed or
+# moved copy of a cached file gets its own name and path. Page fields come
+# first, as the reader puts them, since the order shows in embedded text
+PAGE_KEYS = ("page_label",)
+
+
+class ParseCache:
+    """Extracted page text of every parsed file, keyed by the file's content hash.
+
+    Each file is one gzipped JSONL file of pages holding the text, the
+    per-page metadata and the metadata keys excluded from embedding and LLM
+    text. Entries are written whole and swapped in, so an interrupted build
+    never leaves a partial file behind. Changing chunk settings re-chunks
+    from here without parsing a PDF again.
+    """
+
+    def __init__(self, path: str = os.getenv("PARSE_CACHE_DIR", ".parse_cache")):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, digest: str) -> str:
+        return os.path.join(self.path, f"{digest}.jsonl.gz")
+
+    def get(self, digest: str, file_metadata: dict) -> list | None:
+        """The cached documents for digest with file_metadata applied, or None."""
+        try:
+            with gzip.open(self._entry(digest), 'rt', encoding='utf-8') as f:
+                pages = [json.loads(line) for line in f]
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [Document(text=page["text"], metadata={**page["metadata"], **file_metadata},
+                         excluded_embed_metadata_keys=page["excluded_embed"],
+                         excluded_llm_metadata_keys=page["excluded_llm"])
+                for page in pages]
+
+    def put(self, digest: str, docs: list):
+        tmp = f"{self._entry(digest)}.{os.getpid()}.tmp"
+        with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=5) as f:
+            for doc in docs:
+                f.write(json.dumps({
+                    "text": doc.text,
+                    "metadata": {key: doc.metadata[key] for key in PAGE_KEYS if key in doc.metadata},
+                    "excluded_embed": doc.excluded_embed_metadata_keys,
+                    "excluded_llm": doc.excluded_llm_metadata_keys,
+                }) + "\n")
+        os.replace(tmp, self._entry(digest))
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"{self.hits} files read from cache, {self.misses} parsed ({rate:.0%} hit rate)"
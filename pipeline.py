@@ -0,0 +1,178 @@
+import queue
+import threading
+import time
+from typing import Callable, Iterable
+
+from telemetry import METRICS
+
+# Tells a worker that everything upstream has finished
+_DONE = object()
+
+
+class Stage:
+    """One step of a Pipeline: `fn` turns an item into an iterable of items for the next stage.
+
+    `workers` threads run fn concurrently, fed from a queue holding at most
+    `queue_size` items. Time is split three ways per worker: busy in fn,
+    starved waiting for input, and blocked waiting for room downstream.
+    """
+
+    def __init__(self, name: str, fn: Callable[[object], Iterable | None], workers: int = 1,
+                 queue_size: int = 8):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.items_in = 0
+        self.items_out = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.depth_total = 0
+        self.depth_max = 0
+        self.samples = 0
+        self._finished = 0
+        self._lock = threading.Lock()
+
+    def record(self, items_in: int = 0, items_out: int = 0, failed: int = 0, busy: float = 0.0,
+               starved: float = 0.0, blocked: float = 0.0):
+        with self._lock:
+            self.items_in += items_in
+            self.items_out += items_out
+            self.failed += failed
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+
+    def sample_depth(self):
+        depth = self.inbox.qsize()
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+        self.samples += 1
+        METRICS.set("gambler_ingest_queue_depth", depth, stage=self.name)
+
+    @property
+    def depth_mean(self) -> float:
+        return self.depth_total / self.samples if self.samples else 0.0
+
+
+class Pipeline:
+    """Stages connected by bounded queues, each running on its own worker threads.
+
+    A full queue blocks the stage feeding it, so a slow stage holds back
+    everything upstream instead of letting work pile up in memory, and the
+    first items reach the last stage while the source is still producing.
+    Items whose fn raises are counted as failed and dropped. Progress is
+    printed every `report_interval` seconds; queue depths are sampled every
+    `sample_interval` and exported as gauges alongside per-item histograms.
+    """
+
+    def __init__(self, stages: list, report_interval: float = 10.0, sample_interval: float = 0.25):
+        self.source = Stage("source", None)
+        self.stages = stages
+        self.report_interval = report_interval
+        self.sample_interval = sample_interval
+        self.start = None
+        self.elapsed = 0.0
+
+    def run(self, source: Iterable):
+        """Feed every item of source through the stages and wait for all of them to finish."""
+        self.start = time.perf_counter()
+        stopped = threading.Event()
+        threads = [threading.Thread(target=self._feed, args=(source,), name="source")]
+        for i, stage in enumerate(self.stages):
+            threads += [threading.Thread(target=self._work, args=(i,), name=f"{stage.name}-{n}")
+                        for n in range(stage.workers)]
+        monitor = threading.Thread(target=self._monitor, args=(stopped,), daemon=True)
+        monitor.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stopped.set()
+        monitor.join()
+        self.elapsed = time.perf_counter() - self.start
+
+    def _feed(self, source: Iterable):
+        first = self.stages[0]
+        items = iter(source)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    print(f"source failed: {type(e).__name__}: {e}")
+                    self.source.record(failed=1, busy=time.perf_counter() - start)
+                    break
+                produced = time.perf_counter()
+                first.inbox.put(item)
+                self.source.record(items_out=1, busy=produced - start, blocked=time.perf_counter() - produced)
+        finally:
+            for _ in range(first.workers):
+                first.inbox.put(_DONE)
+
+    def _work(self, i: int):
+        stage = self.stages[i]
+        downstream = self.stages[i + 1] if i + 1 < len(self.stages) else None
+        while True:
+            start = time.perf_counter()
+            item = stage.inbox.get()
+            received = time.perf_counter()
+            if item is _DONE:
+                stage.record(starved=received - start)
+                break
+            try:
+                outputs = list(stage.fn(item) or ())
+            except Exception as e:
+                print(f"{stage.name} failed: {type(e).__name__}: {e}")
+                stage.record(items_in=1, failed=1, starved=received - start, busy=time.perf_counter() - received)
+                continue
+            done = time.perf_counter()
+            METRICS.observe("gambler_ingest_item_seconds", done - received, stage=stage.name)
+            if downstream is not None:
+                for output in outputs:
+                    downstream.inbox.put(output)
+            stage.record(items_in=1, items_out=len(outputs), starved=received - start, busy=done - received,
+                         blocked=time.perf_counter() - done)
+            METRICS.inc("gambler_ingest_items_total", stage=stage.name)
+
+        with stage._lock:
+            stage._finished += 1
+            last = stage._finished == stage.workers
+        if last and downstream is not None:
+            for _ in range(downstream.workers):
+                downstream.inbox.put(_DONE)
+
+    def _monitor(self, stopped: threading.Event):
+        next_report = time.perf_counter() + self.report_interval
+        while not stopped.wait(self.sample_interval):
+            for stage in self.stages:
+                stage.sample_depth()
+            if time.perf_counter() >= next_report:
+                next_report += self.report_interval
+                print(self.progress())
+
+    def progress(self) -> str:
+        elapsed = time.perf_counter() - self.start
+        return f"[{elapsed:6.1f}s] " + " | ".join(
+            f"{stage.name} {stage.items_in} done, {stage.inbox.qsize()} queued" for stage in self.stages)
+
+    def summary(self) -> str:
+        """Per-stage throughput and where the time went, naming the busiest stage as the bottleneck."""
+        elapsed = max(self.elapsed or time.perf_counter() - self.start, 1e-9)
+        lines = [f"{'stage':<14} {'workers':>7} {'in':>7} {'out':>7} {'failed':>6} {'per sec':>8} "
+                 f"{'busy':>6} {'starved':>7} {'blocked':>7} {'queue avg':>9} {'max':>4}"]
+        for stage in [self.source] + self.stages:
+            capacity = stage.workers * elapsed
+            queued = "" if stage is self.source else f"{stage.depth_mean:>9.1f} {stage.depth_max:>4}"
+            lines.append(f"{stage.name:<14} {stage.workers:>7} {stage.items_in:>7} {stage.items_out:>7} "
+                         f"{stage.failed:>6} {max(stage.items_in, stage.items_out) / elapsed:>8.2f} "
+                         f"{stage.busy / capacity:>6.0%} {stage.starved / capacity:>7.0%} "
+                         f"{stage.blocked / capacity:>7.0%} {queued}")
+        bottleneck = max([self.source] + self.stages, key=lambda stage: stage.busy / stage.workers)
+        lines.append(f"Bottleneck: {bottleneck.name} (busiest per worker over {elapsed:.1f}s)")
+        return "\n".join(lines)
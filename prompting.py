@@ -0,0 +1,107 @@
+import re
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD = 4
+EXCERPT_TAG = re.compile(r"<excerpt\b[^>]*>.*?</excerpt>|<no_relevant_content>.*?</no_relevant_content>", re.S)
+
+USER_TEMPLATE = """Question: {query}
+
+Trusted content:
+{excerpts}
+
+Please answer the question based only on the provided trusted content above."""
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count under cl100k_base, the encoding of ada-002 and the chat models."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # No encoding available offline; roughly four characters per token
+            _encoding = False
+    if _encoding is False:
+        return (len(text) + 3) // 4
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def strip_excerpts(content: str) -> str:
+    """History never needs the excerpts an earlier turn was answered from."""
+    return EXCERPT_TAG.sub("", content).strip()
+
+
+def summarize_turns(turns: list, budget: int) -> str | None:
+    """One short message standing in for turns trimmed from the history.
+
+    Keeps the questions asked, newest first, since they are what a
+    follow-up like "what about Ohio?" usually refers back to.
+    """
+    questions = [" ".join(m["content"].split()) for m in reversed(turns) if m["role"] == "user"]
+    if not questions or budget <= MESSAGE_OVERHEAD:
+        return None
+    lines = ["Earlier in this conversation the user asked:"]
+    for question in questions:
+        if count_tokens("\n".join(lines + [f"- {question}"])) + MESSAGE_OVERHEAD > budget:
+            break
+        lines.append(f"- {question}")
+    return "\n".join(lines) if len(lines) > 1 else None
+
+
+def assemble_prompt(system_message: str, history: list, query: str, excerpts: list,
+                    budget: int = 12000, history_budget: int = 3000) -> tuple:
+    """Build chat messages that fit in `budget` tokens; returns (messages, report).
+
+    Excerpts are expected best first and are packed in that order; one that
+    does not fit is skipped in favour of smaller ones further down. History
+    gets at most `history_budget` tokens: the most recent turns are kept
+    whole and older ones are folded into a one-message summary.
+    """
+    system_tokens = count_tokens(system_message) + MESSAGE_OVERHEAD
+    frame_tokens = count_tokens(USER_TEMPLATE.format(query=query, excerpts="")) + MESSAGE_OVERHEAD
+    available = budget - system_tokens - frame_tokens
+
+    # History first, so excerpts can use whatever it leaves
+    history_limit = max(0, min(history_budget, available))
+    kept, history_tokens = [], 0
+    history = [{"role": m["role"], "content": strip_excerpts(m["content"])} for m in history]
+    for i in range(len(history) - 1, -1, -1):
+        tokens = count_tokens(history[i]["content"]) + MESSAGE_OVERHEAD
+        if history_tokens + tokens > history_limit:
+            break
+        kept.insert(0, history[i])
+        history_tokens += tokens
+    dropped = history[:len(history) - len(kept)]
+    # Don't open the kept history on an orphaned assistant reply
+    while kept and kept[0]["role"] == "assistant":
+        dropped.append(kept.pop(0))
+        history_tokens -= count_tokens(dropped[-1]["content"]) + MESSAGE_OVERHEAD
+    if dropped:
+        summary = summarize_turns(dropped, history_limit - history_tokens)
+        if summary:
+            kept.insert(0, {"role": "system", "content": summary})
+            history_tokens += count_tokens(summary) + MESSAGE_OVERHEAD
+
+    packed, excerpt_tokens = [], 0
+    for excerpt in excerpts:
+        tokens = count_tokens(excerpt) + 1
+        if history_tokens + excerpt_tokens + tokens <= available:
+            packed.append(excerpt)
+            excerpt_tokens += tokens
+
+    messages = [{"role": "system", "content": system_message}, *kept,
+                {"role": "user", "content": USER_TEMPLATE.format(query=query, excerpts="\n".join(packed))}]
+    report = {
+        "assembled_prompt_tokens": system_tokens + history_tokens + frame_tokens + excerpt_tokens,
+        "system_tokens": system_tokens,
+        "history_tokens": history_tokens,
+        "excerpt_tokens": excerpt_tokens,
+        "history_turns_kept": sum(m["role"] != "system" for m in kept),
+        "history_turns_dropped": len(dropped),
+        "excerpts_packed": len(packed),
+        "excerpts_dropped": len(excerpts) - len(packed),
+    }
+    return messages, report
@@ -1,130 +1,111 @@
-import requests
-from bs4 import BeautifulSoup
-import math
-
-def fetch_publication_url(root_url: str, publications: int, group: int, all: bool = False, verbose: bool = False):
-   pages = math.ceil(publications / group)
-   url_list = [root_url + str(i) + '/' for i in range(1, pages + 1)]
-   all_links = []  # Store all the links from all pages
-  
-   headers = {
-       'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:141.0) Gecko/20100101 Firefox/141.0',
-       'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-       'Accept-Language': 'en-US,en;q=0.5',
-       'Accept-Encoding': 'deflate',
-       'Connection': 'keep-alive',
-       'Upgrade-Insecure-Requests': '1',
-       'Sec-Fetch-Mode': 'navigate',
-       'Sec-Fetch-Site': 'same-origin',
-       'Sec-Fetch-User': '?1',
-       'Priority': 'u=0, i',
-       'Pragma': 'no-cache',
-       'Cache-Control': 'no-cache'
-   }
-
-   for url in url_list:
-       if verbose:
-           print(f"Fetching {url}...")
-       res = requests.get(url, headers=headers)
-       if res.status_code != 200:
-           print(f"Failed to fetch {url}, status code: {res.status_code}")
-           continue
-      
-       res.encoding = 'utf-8'
-       soup = BeautifulSoup(res.content, 'html.parser')
-       # print(soup)
-       links = soup.find_all('a', class_='button')
-       all_links.extend(link.get('href') for link in links if link.get('href') and link.text.strip() == "Read More")
-      
-   return all_links
-
-
-def mine_links(links: list, all: bool = False, verbose: bool = False):
-   all_downloads = []
-   if not all:
-       return links[:5]  # Return first 5 links for brevity
-   else:
-       for link in links:
-           if verbose:
-               print(f"Processing link: {link}")
-           headers = {
-               'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:141.0) Gecko/20100101 Firefox/141.0',
-               'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-               'Accept-Language': 'en-US,en;q=0.5',
-               'Accept-Encoding': 'deflate',
-               'Connection': 'keep-alive',
-               'Upgrade-Insecure-Requests': '1',
-               'Sec-Fetch-Mode': 'navigate',
-               'Sec-Fetch-Site': 'same-origin',
-               'Sec-Fetch-User': '?1',
-               'Priority': 'u=0, i',
-               'Pragma': 'no-cache',
-               'Cache-Control': 'no-cache'
-           }
-           res = requests.get(link, headers=headers)
-           if res.status_code != 200:
-               print(f"Failed to fetch {link}, status code: {res.status_code}")
+import argparse
+import os
+
+from crawler import Crawler, Manifest, parse_listing, parse_publication
+from frontier import Frontier
+
+def fetch_publication_url(root_url: str, frontier: Frontier, crawler: Crawler, full: bool = False):
+   # Until one crawl has reached the last listing page, skip the pages an
+   # interrupted run already walked instead of stopping at known publications
+   resuming = frontier.get_meta("listing_complete") != "1"
+   page = 1
+   new_links = 0
+
+   def fetch(url):
+       res = crawler.get(url, accept=(200, 404))
+       if res is None:
+           return None
+       return parse_listing(res.content) if res.status_code == 200 else []
+
+   while True:
+       window = []
+       while len(window) < crawler.workers:
+           url = root_url + str(page) + '/'
+           page += 1
+           if resuming and not full and frontier.state(url) == 'done':
                continue
-           res.encoding = 'utf-8'
-           soup = BeautifulSoup(res.content, 'html.parser')
-           links = soup.find_all('a', class_='button')
-           all_downloads.extend(link.get('href') for link in links if link.get('href') and link.text.strip() == "Download")
-
-
-   return all_downloads
-
+           window.append(url)
+       frontier.add(window, 'listing')
+
+       stop = False
+       for url, links in zip(window, crawler.map(fetch, window)):
+           if links is None:
+               frontier.mark(url, 'failed')
+               stop = True
+               continue
+           frontier.mark(url, 'done')
+           if not links:
+               # Past the last listing page
+               frontier.set_meta("listing_complete", "1")
+               stop = True
+               continue
+           new = frontier.add(links, 'publication', parent=url)
+           new_links += new
+           if new == 0 and not full and not resuming:
+               # Incremental run reached publications we have already seen
+               stop = True
+       if stop:
+           return new_links
 
-def download_files(link: str, path: str):
-   headers = {
-               'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:141.0) Gecko/20100101 Firefox/141.0',
-               'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-               'Accept-Language': 'en-US,en;q=0.5',
-               'Accept-Encoding': 'deflate',
-               # 'Connection': 'keep-alive',
-               'Upgrade-Insecure-Requests': '1',
-               'Sec-Fetch-Mode': 'navigate',
-               'Sec-Fetch-Site': 'none',
-               'Sec-Fetch-User': '?1',
-               'Priority': 'u=0, i',
-               'Pragma': 'no-cache',
-               'Cache-Control': 'no-cache'
-           }
-   response = requests.get(link, headers=headers)
-   if response.status_code != 200:
-       print(f"Failed to download {link}, status code: {response.status_code}")
-       return
 
+def mine_links(frontier: Frontier, crawler: Crawler, full: bool = False, verbose: bool = False):
+   links = frontier.urls('publication') if full else frontier.pending('publication')
 
-   response.encoding = 'utf-8'
-   filename = link.split('/')[-1]
-   filepath = f"{path}/{filename}"
-   with open(filepath, 'wb') as file:
-       file.write(response.content)
-   print(f"Downloaded: {filename}")
+   def fetch(link):
+       if verbose:
+           print(f"Processing link: {link}")
+       res = crawler.get(link)
+       if res is None:
+           frontier.mark(link, 'failed')
+           return 0
+       new = frontier.add(parse_publication(res.content), 'download', parent=link)
+       frontier.mark(link, 'done')
+       return new
 
+   return sum(crawler.map(fetch, links))
 
 
+def download_files(frontier: Frontier, crawler: Crawler, path: str, manifest: Manifest, full: bool = False):
+   links = frontier.urls('download') if full else frontier.pending('download')
 
-if __name__ == "__main__":
-   root_url = "https://csgjusticecenter.org/publications/page/"
-   publications =  582
-   group = 8
-   links = fetch_publication_url(root_url, publications, group)
-  
-   print(f"Found {len(links)} links total")
-   print("First few links:")
-   for i, link in enumerate(links[:10]):  # Show first 10 links
-       print(f"{i+1}. {link}")
+   def fetch(link):
+       filename = crawler.download(link, path, manifest)
+       frontier.mark(link, 'done' if filename else 'failed')
+       return filename is not None
 
+   return sum(crawler.map(fetch, links))
 
-   downloads = mine_links(links, all=True)
-   print(f"Found {len(downloads)} download links")
-   print("Download links:")
-   for i, download in enumerate(downloads[:10]):  # Show first 10 download links
-       print(f"{i+1}. {download}")
 
 
-   for download in downloads:
-       download_files(download, "downloads") 
-   print("All files downloaded.")
 
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(description="Crawl CSG Justice Center publications and download their PDFs.")
+   parser.add_argument("--root-url", default="https://csgjusticecenter.org/publications/page/",
+                       help="Listing page prefix; point at a local fixture server for testing.")
+   parser.add_argument("--out", default="downloads", help="Directory to save PDFs into.")
+   parser.add_argument("--frontier", default="crawl.db", help="SQLite file recording crawl progress.")
+   parser.add_argument("--full", action="store_true",
+                       help="Re-walk every listing and publication page and re-check every download.")
+   parser.add_argument("--workers", type=int, default=8, help="Concurrent requests in flight.")
+   parser.add_argument("--per-host", type=int, default=4, help="Concurrent requests allowed per host.")
+   parser.add_argument("--verbose", action="store_true")
+   args = parser.parse_args()
+
+   crawler = Crawler(workers=args.workers, per_host=args.per_host, verbose=args.verbose)
+   frontier = Frontier(args.frontier)
+
+   new_links = fetch_publication_url(args.root_url, frontier, crawler, full=args.full)
+   print(f"Found {new_links} new publication links")
+
+   new_downloads = mine_links(frontier, crawler, full=args.full, verbose=args.verbose)
+   print(f"Found {new_downloads} new download links")
+
+   os.makedirs(args.out, exist_ok=True)
+   manifest = Manifest(args.out)
+   downloaded = download_files(frontier, crawler, args.out, manifest, full=args.full)
+   print(f"{downloaded} files downloaded.")
+
+   for (kind, state), n in sorted(frontier.counts().items()):
+       print(f"{kind:>12} {state:<8} {n}")
+   print(f"Crawl throughput: {crawler.stats.summary()}")
+   frontier.close()
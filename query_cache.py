@@ -0,0 +1,90 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation don't change what we retrieve."""
+    return re.sub(r"\s+", " ", query).strip().rstrip("?.!").strip().lower()
+
+
+class QueryCache:
+    """Process-wide LRU cache with a TTL that coalesces concurrent misses.
+
+    When several callers miss on the same key at once, only the first runs
+    the upstream call; the rest wait for its result instead of issuing
+    their own.
+    """
+
+    def __init__(self, ttl: float = 900, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._set(key, value)
+
+    def _set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Cached value for key, computing it at most once across concurrent callers."""
+        with self._lock:
+            value = self._get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._set(key, value)
+            self._in_flight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def summary(self) -> str:
+        total = self.hits + self.misses + self.coalesced
+        rate = (self.hits + self.coalesced) / total if total else 0.0
+        return f"{self.hits} hits, {self.coalesced} coalesced, {self.misses} misses ({rate:.0%} served from cache)"
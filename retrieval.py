@@ -0,0 +1,176 @@
+import re
+import zlib
+
+import numpy as np
+from llama_index.core.schema import NodeWithScore, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+# Chunks are split with 50 tokens of overlap; this comfortably covers it in characters
+MAX_OVERLAP_CHARS = 2000
+MIN_OVERLAP_CHARS = 40
+TEXT_VECTOR_DIM = 1024
+WORD = re.compile(r"\w+")
+
+
+def source_of(node: NodeWithScore) -> str:
+    metadata = node.node.metadata
+    return metadata.get("file_name") or metadata.get("id") or node.node.ref_doc_id or ""
+
+
+def text_overlap(a: str, b: str, min_overlap: int = MIN_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of a that is also a prefix of b."""
+    if len(b) < min_overlap:
+        return 0
+    tail = a[-MAX_OVERLAP_CHARS:]
+    probe = b[:min_overlap]
+    start = tail.find(probe)
+    while start != -1:
+        if b.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+
+def _join(a: NodeWithScore, b: NodeWithScore) -> NodeWithScore | None:
+    """a followed by b with the shared text once, or None if b doesn't continue a."""
+    a_start, a_end, b_start = a.node.start_char_idx, a.node.end_char_idx, b.node.start_char_idx
+    offsets = None not in (a_start, a_end, b_start)
+    if offsets and not a_start <= b_start <= a_end + 2:
+        return None
+    a_text, b_text = a.node.get_content(), b.node.get_content()
+    overlap = text_overlap(a_text, b_text)
+    if not overlap and not offsets:
+        return None
+    b_end = b.node.end_char_idx
+    if offsets and b_end is not None and b_end <= a_end:
+        # b lies wholly inside a
+        text, b_end = a_text, a_end
+    else:
+        text = a_text + b_text[overlap:] if overlap else f"{a_text} {b_text}"
+    node = TextNode(id_=a.node.node_id, text=text, metadata=dict(a.node.metadata),
+                    start_char_idx=a_start, end_char_idx=b_end,
+                    excluded_embed_metadata_keys=a.node.excluded_embed_metadata_keys,
+                    excluded_llm_metadata_keys=a.node.excluded_llm_metadata_keys,
+                    relationships=a.node.relationships)
+    return NodeWithScore(node=node, score=max(a.score or 0.0, b.score or 0.0))
+
+
+def merge_excerpts(nodes: list) -> list:
+    """Merge retrieved chunks that overlap or sit next to each other in a source.
+
+    Neighbouring chunks of one report otherwise arrive as separate excerpts
+    that repeat the overlap text. Chunks are grouped by source and page (the
+    unit a PDF is split into before chunking), and any that touch are joined
+    with the overlap kept once; a merged excerpt keeps the page label and the
+    best score of its parts. Returned best first.
+    """
+    groups = {}
+    for node in nodes:
+        groups.setdefault((source_of(node), node.node.metadata.get("page_label")), []).append(node)
+
+    merged = []
+    for group in groups.values():
+        if all(node.node.start_char_idx is not None for node in group):
+            group = sorted(group, key=lambda node: node.node.start_char_idx)
+        # Without offsets the order is unknown, so try every pair both ways
+        changed = True
+        while changed and len(group) > 1:
+            changed = False
+            for i in range(len(group)):
+                for j in range(len(group)):
+                    if i == j:
+                        continue
+                    joined = _join(group[i], group[j])
+                    if joined is not None:
+                        group = [node for k, node in enumerate(group) if k not in (i, j)]
+                        group.insert(min(i, j), joined)
+                        changed = True
+                        break
+                if changed:
+                    break
+        merged.extend(group)
+    return sorted(merged, key=lambda node: node.score or 0.0, reverse=True)
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """Fuse several best-first result lists into one by reciprocal rank.
+
+    Each node earns 1 / (k + rank) from every list it appears in, so ranks
+    from indexes with differently distributed scores can be combined. The
+    same chunk found in two indexes is kept once, with its best similarity
+    as its score so `min_similarity` still applies after fusion.
+    """
+    fused, best = {}, {}
+    for ranking in rankings:
+        for rank, node in enumerate(ranking, start=1):
+            key = (source_of(node), node.node.metadata.get("page_label"), hash(node.node.get_content()))
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+            if key not in best or (node.score or 0.0) > (best[key].score or 0.0):
+                best[key] = node
+    return [best[key] for key in sorted(fused, key=fused.get, reverse=True)]
+
+
+def keyword_ranking(index, keywords, query: str, query_embedding: list, top_k: int,
+                    node_ids: list | None = None, min_similarity: float | None = None) -> list:
+    """BM25 matches as nodes, best first, scored by vector similarity like dense results.
+
+    Giving keyword hits their cosine similarity keeps the excerpt confidences
+    the prompt relies on meaningful whichever search found them, and lets
+    `min_similarity` drop weak hits just as it does dense ones. node_ids,
+    when given, limits the matches to those chunks.
+    """
+    hits = list(dict.fromkeys(node_id for node_id, _ in keywords.search(query, top_k, node_ids=node_ids)))
+    if not hits:
+        return []
+    result = index.vector_store.query(
+        VectorStoreQuery(query_embedding=query_embedding, similarity_top_k=len(hits), node_ids=hits),
+        min_similarity=min_similarity, exact=True)
+    similarity = dict(zip(result.ids, result.similarities))
+    if min_similarity is not None:
+        hits = [i for i in hits if i in similarity]
+    nodes = {node.node_id: node for node in index.docstore.get_nodes(hits, raise_error=False) if node is not None}
+    return [NodeWithScore(node=nodes[i], score=similarity.get(i, 0.0)) for i in hits if i in nodes]
+
+
+def text_vectors(texts: list, dim: int = TEXT_VECTOR_DIM) -> np.ndarray:
+    """Normalised hashed term-frequency vectors, for nodes that arrive without embeddings."""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        buckets = [zlib.crc32(word.encode()) % dim for word in WORD.findall(text.lower())]
+        vectors[i] = np.bincount(buckets, minlength=dim)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def mmr_rerank(nodes: list, top_k: int, diversity: float = 0.3, embeddings: np.ndarray | None = None) -> list:
+    """Pick top_k nodes by maximal marginal relevance.
+
+    Each pick maximises (1 - diversity) * relevance - diversity * (highest
+    similarity to anything already picked), so near-duplicate chunks of one
+    report give way to new information. Relevance is the retrieval score;
+    pairwise similarity comes from `embeddings` (one normalised row per
+    node) or, failing those, from the node embeddings or their text. The
+    similarity matrix is computed once and each pick is a vector update.
+    """
+    if diversity <= 0 or len(nodes) <= 1:
+        return nodes[:top_k]
+    if embeddings is None:
+        if all(node.node.embedding is not None for node in nodes):
+            embeddings = np.asarray([node.node.embedding for node in nodes], dtype=np.float32)
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        else:
+            embeddings = text_vectors([node.node.get_content() for node in nodes])
+
+    relevance = np.asarray([node.score or 0.0 for node in nodes], dtype=np.float32)
+    similarity = embeddings @ embeddings.T
+    redundancy = np.full(len(nodes), -np.inf, dtype=np.float32)
+    available = np.ones(len(nodes), dtype=bool)
+    picked = []
+    for _ in range(min(top_k, len(nodes))):
+        score = (1 - diversity) * relevance - diversity * np.maximum(redundancy, 0)
+        score[~available] = -np.inf
+        best = int(np.argmax(score))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[:, best])
+    return [nodes[i] for i in picked]
@@ -1,104 +1,142 @@
-from openai import OpenAI
-from llama_index.core import StorageContext, load_index_from_storage, Settings
-from llama_index.embeddings.openai import OpenAIEmbedding
+import answer_server
+import argparse
 import dotenv
-import os
+import json
 import sys
+import time
 
 dotenv.load_dotenv()
 
-# Configure embedding model (same as used when creating the index)
-Settings.embed_model = OpenAIEmbedding(
-    model="text-embedding-ada-002",
-    api_key=os.getenv("CHATGPT_API_KEY")
-)
-
-storage_context = StorageContext.from_defaults(persist_dir="./storage")
-index = load_index_from_storage(storage_context)
-
-def retrieve_trusted_content(query: str, top_k: int = 5, min_similarity: float = 0.7):
-    retriever = index.as_retriever(similarity_top_k=top_k)
-    nodes = retriever.retrieve(query)
-    filtered_nodes = [node for node in nodes if node.score >= min_similarity]
-    
-    if not filtered_nodes:
-        return ["<no_relevant_content>No sufficiently relevant content found.</no_relevant_content>"]
-    
-    return [f"<excerpt confidence=\"{node.score:.2f}\">{node.text}</excerpt>" 
-            for node in filtered_nodes]
-
-client = OpenAI(api_key=os.getenv("CHATGPT_API_KEY"))
-
-def chat_with_retrieval(query: str):
-    # Get trusted content first
-    excerpts = retrieve_trusted_content(query)
-    
-    # Create system message
-    system_message = """
-    You are a helpful, but terse, assistant.
-    If you can't answer the question based on the trusted content, say so.
-
-    STRICT RULES:
-    - Only use information explicitly stated in the <excerpt> tags
-    - If the excerpts don't contain enough information to answer the question, say "The provided content does not contain sufficient information to answer this question"
-    - Always cite which excerpt(s) you're using by referencing the confidence scores
-    - Never make assumptions or fill in gaps with outside knowledge
-    - If confidence scores are low (<0.7), mention this uncertainty in your response
-    - Always tell me the name of the report that you pulled the excerpts from and if information is coming from multiple reports note it.
-    """
-
-    # Create user message with retrieved content
-    user_message = f"""Question: {query}
-
-    Trusted content:
-    {chr(10).join(excerpts)}
-
-    Please answer the question based only on the provided trusted content above."""
-
-    # Make the API call
-    response = client.chat.completions.create(
-        model="gpt-5",
-        messages=[
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": user_message}
-        ],
-        temperature=1  # Defaul is 1 for gpt-5
-    )
-    
-    return response.choices[0].message.content
+# The index and clients live in trusted_content, which is only imported when
+# no answer server is running; with one, this script is a thin client
+
+
+def read_questions(path: str) -> list:
+    source = sys.stdin if path == "-" else open(path)
+    try:
+        return [line.strip() for line in source if line.strip()]
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+def run_batch(args, questions: list) -> dict:
+    output = sys.stdout if args.output == "-" else open(args.output, 'w')
+    try:
+        lines = None if args.no_server else answer_server.stream("/batch", {
+            "questions": questions, "top_k": args.top_k, "min_similarity": args.min_similarity,
+            "concurrency": args.concurrency, "requests_per_minute": args.requests_per_minute,
+            "batch_size": args.batch_size}, port=args.port)
+        if lines is not None:
+            counts = {}
+            for line in lines:
+                if line.startswith('{"summary"'):
+                    counts = json.loads(line)["summary"]
+                elif line.startswith('{"error"'):
+                    raise RuntimeError(json.loads(line)["error"])
+                else:
+                    output.write(line)
+                    output.flush()
+            return counts
+
+        import trusted_content
+        counts = trusted_content.answer_batch(questions, output, top_k=args.top_k,
+                                              min_similarity=args.min_similarity,
+                                              concurrency=args.concurrency, per_minute=args.requests_per_minute,
+                                              batch_size=args.batch_size)
+        print(f"Embedding cache: {trusted_content.Settings.embed_model.cache.summary()}", file=sys.stderr)
+        return counts
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+def answer_one(args, query: str) -> tuple:
+    """(answer, timings, where it was answered, embedding cache summary)"""
+    options = {"top_k": args.top_k, "min_similarity": args.min_similarity}
+    reply = None if args.no_server else answer_server.post("/answer", {"query": query, **options}, port=args.port)
+    if reply is not None:
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply["answer"], reply["timings"], "answer server", reply["embedding_cache"]
+
+    start = time.perf_counter()
+    import trusted_content
+    trusted_content.get_store()
+    load_ms = round((time.perf_counter() - start) * 1000, 1)
+    answer, timings = trusted_content.chat_with_retrieval(query, **options)
+    return (answer, {"load_ms": load_ms, **timings}, "this process",
+            trusted_content.Settings.embed_model.cache.summary())
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Answer questions from the local index.",
+        epilog="Example: python retrieve-trusted-content.py \"What have we written about the strategies "
+               "for reducing recidivism among young adults in the justice system?\"")
+    parser.add_argument("question", nargs="*", help="A single question to answer.")
+    parser.add_argument("--questions", help="File of questions, one per line ('-' for stdin), answered as a batch.")
+    parser.add_argument("--output", default="-", help="JSONL file for batch answers ('-' for stdout).")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--min-similarity", type=float, default=0.7)
+    parser.add_argument("--concurrency", type=int, default=8, help="Completions in flight at once.")
+    parser.add_argument("--requests-per-minute", type=float, default=300,
+                        help="Completion requests started per minute; 0 for no limit.")
+    parser.add_argument("--batch-size", type=int, default=256, help="Questions embedded and searched together.")
+    parser.add_argument("--serve", action="store_true",
+                        help="Keep the index and clients loaded and answer for other invocations.")
+    parser.add_argument("--port", type=int, default=answer_server.DEFAULT_PORT, help="Answer server port.")
+    parser.add_argument("--no-server", action="store_true",
+                        help="Load the index in this process even if an answer server is running.")
+    args = parser.parse_args()
+
+    if args.serve:
+        start = time.perf_counter()
+        server = answer_server.serve(args.port)
+        print(f"Answer server ready in {time.perf_counter() - start:.1f}s on http://127.0.0.1:{args.port}")
+        # The one accept loop runs here, so Ctrl-C stops the whole server
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    if args.questions:
+        questions = read_questions(args.questions)
+        start = time.perf_counter()
+        counts = run_batch(args, questions)
+        elapsed = time.perf_counter() - start
+        print(f"{counts.get('answered', 0)} answered, {counts.get('failed', 0)} failed in {elapsed:.1f}s "
+              f"({len(questions) / max(elapsed, 1e-9):.2f} questions/sec)", file=sys.stderr)
+        sys.exit(1 if counts.get("failed") or not counts else 0)
+
     # Check if question was provided as command line argument
-    if len(sys.argv) < 2:
-        print("Please provide a question as a command line argument.")
-        print("Usage: python script.py \"Your question here\"")
-        print("Example: python script.py \"What have we written about the strategies for reducing recidivism among young adults in the justice system?\"")
+    if not args.question:
+        parser.print_help()
         sys.exit(1)
-   
+
     # Join all arguments after the script name to handle multi-word questions
-    query = " ".join(sys.argv[1:])
-   
+    query = " ".join(args.question)
+
     print(f"Question: {query}")
     print("-" * 50)
     print("⚠️  DISCLAIMER: This response is AI-generated based on document retrieval.")
     print("Please verify important information with original sources.")
     print("-" * 50)
-   
-    try:
-        answer = chat_with_retrieval(query)
-        print(answer)
-    except Exception as e:
-        print(f"Error: {e}")
-        sys.exit(1)
-    
+
     try:
-        answer = chat_with_retrieval(query)
+        answer, timings, where, cache_summary = answer_one(args, query)
         print(answer)
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
 
+    print("-" * 50)
+    print(f"Answered by {where}: " + ", ".join(f"{name} {ms:.0f}" for name, ms in timings.items()))
+    print(f"Embedding cache: {cache_summary}")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
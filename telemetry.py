@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("telemetry")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Upper bounds in seconds, wide enough to hold a slow gpt-5 answer
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+class Metrics:
+    """Prometheus-style histograms, counters and gauges, rendered in the text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            counts, total = self._histograms.get(key, ([0] * (len(BUCKETS) + 1), 0.0))
+            # Buckets are cumulative, as Prometheus expects
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._histograms[key] = (counts, total + value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    @staticmethod
+    def _labels(labels: tuple, **extra) -> str:
+        pairs = list(labels) + list(extra.items())
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), (counts, total) in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for bound, count in zip(BUCKETS, counts):
+                    lines.append(f"{name}_bucket{self._labels(labels, le=bound)} {count}")
+                lines.append(f"{name}_bucket{self._labels(labels, le='+Inf')} {counts[-1]}")
+                lines.append(f"{name}_sum{self._labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{self._labels(labels)} {counts[-1]}")
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{self._labels(labels)} {value:g}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} gauge")
+                    typed.add(name)
+                lines.append(f"{name}{self._labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+METRICS = Metrics()
+_exporter_lock = threading.Lock()
+_exporter_started = False
+
+
+def start_exporter():
+    """Serve /metrics on METRICS_PORT if it is set; safe to call on every rerun."""
+    global _exporter_started
+    port = os.getenv("METRICS_PORT")
+    with _exporter_lock:
+        if _exporter_started or not port:
+            return
+        _exporter_started = True
+    METRICS.serve(int(port))
+
+
+class Trace:
+    """Timing spans for one retrieve-and-generate request.
+
+    Each `span` records its duration in a histogram labelled with the app
+    and stage. `finish` writes the whole request as one JSON log line and,
+    when METRICS_FILE is set, refreshes that file with the current metrics.
+    """
+
+    def __init__(self, app: str, **attrs):
+        self.app = app
+        self.id = uuid.uuid4().hex[:12]
+        self.attrs = dict(attrs)
+        self.spans = {}
+        self._start = time.perf_counter()
+        self._finished = False
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float):
+        self.spans[stage] = self.spans.get(stage, 0) + seconds * 1e3
+        METRICS.observe("gambler_stage_duration_seconds", seconds, app=self.app, stage=stage)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def fail(self, error: BaseException):
+        self.set(error=type(error).__name__)
+        self.finish()
+
+    def wrap_stream(self, response_stream, start: float | None = None):
+        """Yield chat completion chunks, timing first token and full generation.
+
+        Usage-only chunks (sent when `stream_options={"include_usage": True}`)
+        are consumed here rather than passed on. Pass the perf_counter time
+        the request was sent as `start` so time to first token includes it.
+        """
+        start = start or time.perf_counter()
+        first = None
+        chunks = 0
+        try:
+            for chunk in response_stream:
+                if getattr(chunk, "usage", None) is not None:
+                    self.set(prompt_tokens=chunk.usage.prompt_tokens,
+                             completion_tokens=chunk.usage.completion_tokens)
+                if not chunk.choices:
+                    continue
+                if first is None and chunk.choices[0].delta.content:
+                    first = time.perf_counter()
+                    self.record("ttft", first - start)
+                chunks += 1
+                yield chunk
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            self.set(error=type(e).__name__)
+            raise
+        finally:
+            # Also reached when the consumer stops early and the generator is closed
+            self.record("generate", time.perf_counter() - start)
+            self.set(stream_chunks=chunks)
+            self.finish()
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        total = time.perf_counter() - self._start
+        self.record("total", total)
+        METRICS.inc("gambler_requests_total", app=self.app, status="error" if "error" in self.attrs else "ok")
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if kind in self.attrs:
+                METRICS.inc("gambler_tokens_total", self.attrs[kind], app=self.app, kind=kind)
+        if "excerpts" in self.attrs:
+            METRICS.inc("gambler_excerpts_total", self.attrs["excerpts"], app=self.app)
+
+        logger.info(json.dumps({"event": "request", "app": self.app, "trace_id": self.id,
+                                "spans_ms": {k: round(v, 2) for k, v in self.spans.items()},
+                                **self.attrs}, default=str))
+        metrics_file = os.getenv("METRICS_FILE")
+        if metrics_file:
+            METRICS.write(metrics_file)
@@ -0,0 +1,231 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+import dotenv
+from llama_index.core import QueryBundle, Settings
+from llama_index.core.retrievers import VectorIndexRetriever
+from llama_index.core.schema import NodeWithScore
+from llama_index.embeddings.openai import OpenAIEmbedding
+from openai import OpenAI
+
+from embed_scheduler import is_rate_limited, retry_after
+from embedding_cache import CachedEmbedding
+from keyword_index import KeywordIndex
+from local_store import load_index
+from retrieval import keyword_ranking, merge_excerpts, reciprocal_rank_fusion, source_of
+from vector_store import IDS_FNAME
+
+dotenv.load_dotenv()
+
+# Configure embedding model (same as used when creating the index)
+Settings.embed_model = CachedEmbedding(OpenAIEmbedding(
+    model="text-embedding-ada-002",
+    api_key=os.getenv("CHATGPT_API_KEY")
+))
+
+STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "./storage")
+
+SYSTEM_MESSAGE = """
+    You are a helpful, but terse, assistant.
+    If you can't answer the question based on the trusted content, say so.
+
+    STRICT RULES:
+    - Only use information explicitly stated in the <excerpt> tags
+    - If the excerpts don't contain enough information to answer the question, say "The provided content does not contain sufficient information to answer this question"
+    - Always cite which excerpt(s) you're using by referencing the confidence scores
+    - Never make assumptions or fill in gaps with outside knowledge
+    - If confidence scores are low (<0.7), mention this uncertainty in your response
+    - Always tell me the name of the report that you pulled the excerpts from and if information is coming from multiple reports note it.
+    """
+
+
+def store_version(persist_dir: str = STORAGE_DIR) -> int:
+    # Every build that changes the store rewrites the vector ids, so their mtime tells when to reload
+    try:
+        return os.stat(os.path.join(persist_dir, IDS_FNAME)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+@lru_cache(maxsize=1)
+def _load_store(persist_dir: str, version: int) -> tuple:
+    return load_index(persist_dir), KeywordIndex.open(persist_dir)
+
+
+def get_store(persist_dir: str = STORAGE_DIR) -> tuple:
+    """(index, keyword index or None), loaded once and reloaded when the store is rebuilt."""
+    return _load_store(persist_dir, store_version(persist_dir))
+
+
+@lru_cache(maxsize=1)
+def get_client() -> OpenAI:
+    return OpenAI(api_key=os.getenv("CHATGPT_API_KEY"))
+
+
+def fuse_and_merge(query: str, embedding: list, nodes: list, top_k: int,
+                   min_similarity: float | None = None) -> list:
+    index, keywords = get_store()
+    if keywords is not None:
+        # Fuse in exact-term matches that dense search misses, held to the same similarity cutoff
+        keyword_nodes = keyword_ranking(index, keywords, query, embedding, top_k, min_similarity=min_similarity)
+        nodes = reciprocal_rank_fusion([nodes, keyword_nodes])[:top_k]
+    # Neighbouring chunks of one document become one excerpt without the repeated overlap
+    return merge_excerpts(nodes)
+
+
+def format_excerpts(nodes: list) -> list:
+    if not nodes:
+        return ["<no_relevant_content>No sufficiently relevant content found.</no_relevant_content>"]
+
+    return [f"<excerpt confidence=\"{node.score:.2f}\">{node.text}</excerpt>"
+            for node in nodes]
+
+
+def retrieve_trusted_content(query: str, top_k: int = 5, min_similarity: float = 0.7):
+    index, _ = get_store()
+    embedding = Settings.embed_model.get_query_embedding(query)
+    # min_similarity is applied inside the vector search. Built directly, since
+    # as_retriever would pass every node id in the index as a filter
+    retriever = VectorIndexRetriever(index, similarity_top_k=top_k,
+                                     vector_store_kwargs={"min_similarity": min_similarity})
+    nodes = retriever.retrieve(QueryBundle(query, embedding=embedding))
+    return format_excerpts(fuse_and_merge(query, embedding, nodes, top_k, min_similarity))
+
+
+def retrieve_batch(queries: list, top_k: int = 5, min_similarity: float = 0.7) -> tuple:
+    """Merged nodes for every query, embedded in batches and searched in one pass.
+
+    Returns (nodes per query, seconds embedding, seconds searching); the
+    timings cover the whole batch.
+    """
+    index, _ = get_store()
+    start = time.perf_counter()
+    embeddings = Settings.embed_model.get_query_embedding_batch(queries)
+    embed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = index.vector_store.query_batch(embeddings, top_k, min_similarity=min_similarity)
+    # One docstore lookup for every hit in the batch
+    wanted = list(dict.fromkeys(node_id for result in results for node_id in result.ids))
+    stored = {node.node_id: node for node in index.docstore.get_nodes(wanted, raise_error=False) if node is not None}
+    nodes = []
+    for query, embedding, result in zip(queries, embeddings, results):
+        hits = [NodeWithScore(node=stored[i], score=score)
+                for i, score in zip(result.ids, result.similarities) if i in stored]
+        nodes.append(fuse_and_merge(query, embedding, hits, top_k, min_similarity))
+    return nodes, embed_seconds, time.perf_counter() - start
+
+
+def complete(query: str, excerpts: list) -> str:
+    # Create user message with retrieved content
+    user_message = f"""Question: {query}
+
+    Trusted content:
+    {chr(10).join(excerpts)}
+
+    Please answer the question based only on the provided trusted content above."""
+
+    # Make the API call
+    response = get_client().chat.completions.create(
+        model="gpt-5",
+        messages=[
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": user_message}
+        ],
+        temperature=1  # Defaul is 1 for gpt-5
+    )
+
+    return response.choices[0].message.content
+
+
+def chat_with_retrieval(query: str, top_k: int = 5, min_similarity: float = 0.7) -> tuple:
+    """(answer, timings in ms) for one question."""
+    start = time.perf_counter()
+    # Get trusted content first
+    excerpts = retrieve_trusted_content(query, top_k=top_k, min_similarity=min_similarity)
+    retrieved = time.perf_counter()
+    answer = complete(query, excerpts)
+    end = time.perf_counter()
+    return answer, {"retrieve_ms": round((retrieved - start) * 1000, 1),
+                    "completion_ms": round((end - retrieved) * 1000, 1),
+                    "total_ms": round((end - start) * 1000, 1)}
+
+
+class RateLimiter:
+    """Spaces request starts so no more than `per_minute` begin in any minute."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.next_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def complete_with_retry(query: str, excerpts: list, limiter: RateLimiter, max_retries: int = 6,
+                        base_backoff: float = 1.0) -> str:
+    for attempt in range(max_retries + 1):
+        limiter.wait()
+        try:
+            return complete(query, excerpts)
+        except Exception as e:
+            if attempt == max_retries or not is_rate_limited(e):
+                raise
+            time.sleep(retry_after(e) or base_backoff * 2 ** attempt * (0.5 + random.random()))
+
+
+def answer_batch(questions: list, output, top_k: int = 5, min_similarity: float = 0.7,
+                 concurrency: int = 8, per_minute: float = 300, batch_size: int = 256) -> dict:
+    """Answer every question, writing one JSON line per question as it finishes.
+
+    Questions are embedded and searched `batch_size` at a time; completions
+    for a batch start while the next one is retrieved, at most `concurrency`
+    at once and `per_minute` per minute. Lines carry the question's position
+    in the input, since they are written in completion order.
+    """
+    limiter = RateLimiter(per_minute)
+    write_lock = threading.Lock()
+    counts = {"answered": 0, "failed": 0}
+
+    def answer(position: int, question: str, nodes: list, timings: dict, start: float):
+        record = {"index": position, "question": question,
+                  "sources": [{"source": source_of(node), "page": node.node.metadata.get("page_label"),
+                               "score": round(node.score or 0.0, 4)} for node in nodes]}
+        completion_start = time.perf_counter()
+        try:
+            record["answer"] = complete_with_retry(question, format_excerpts(nodes), limiter)
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        timings["completion_ms"] = (time.perf_counter() - completion_start) * 1000
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        record["timings"] = {name: round(ms, 1) for name, ms in timings.items()}
+        with write_lock:
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            counts["failed" if "error" in record else "answered"] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for offset in range(0, len(questions), batch_size):
+            batch = questions[offset:offset + batch_size]
+            start = time.perf_counter()
+            nodes, embed_seconds, search_seconds = retrieve_batch(batch, top_k, min_similarity)
+            # Embedding and search run once per batch, so each question carries its share
+            shared = {"embed_ms": embed_seconds * 1000 / len(batch),
+                      "retrieve_ms": search_seconds * 1000 / len(batch)}
+            futures += [pool.submit(answer, offset + i, question, question_nodes, dict(shared), start)
+                        for i, (question, question_nodes) in enumerate(zip(batch, nodes))]
+        for future in as_completed(futures):
+            future.result()
+    return counts
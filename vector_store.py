@@ -0,0 +1,474 @@
+import json
+import os
+
+import fsspec
+import numpy as np
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQuery, VectorStoreQueryResult
+from pydantic import PrivateAttr
+
+VECTORS_FNAME = "vectors.npy"
+IDS_FNAME = "vector_ids.json"
+ANN_FNAME = "ivf.npz"
+CODES_FNAME = "codes.npy"
+CODES_META_FNAME = "codes.npz"
+# What StorageContext persisted before this store existed
+LEGACY_FNAME = "default__vector_store.json"
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbour index over normalised rows.
+
+    Rows are clustered with spherical k-means into `nlist` lists; a query
+    only scores the rows in the `nprobe` lists whose centroids are closest.
+    Rows appended after the index was built are always scored exactly.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, rows: np.ndarray, nprobe: int = 8):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: int, nprobe: int = 8, iterations: int = 10,
+              sample_per_list: int = 256, seed: int = 0) -> "IVFIndex":
+        rng = np.random.default_rng(seed)
+        nlist = max(1, min(nlist, len(matrix)))
+        sample = matrix[np.sort(rng.choice(len(matrix), min(len(matrix), nlist * sample_per_list),
+                                           replace=False))]
+        centroids = np.array(sample[rng.choice(len(sample), nlist, replace=False)], dtype=np.float32)
+        for _ in range(iterations):
+            assign = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # Reseed empty lists from random sample rows
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize(sums)
+
+        assign = cls._assign(matrix, centroids)
+        rows = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+        return cls(centroids, offsets, rows, nprobe=nprobe)
+
+    @staticmethod
+    def _assign(matrix: np.ndarray, centroids: np.ndarray, block: int = 65536) -> np.ndarray:
+        return np.concatenate([np.argmax(matrix[i:i + block] @ centroids.T, axis=1)
+                               for i in range(0, len(matrix), block)]) if len(matrix) else np.empty(0, np.int64)
+
+    def candidates(self, q: np.ndarray, total_rows: int, nprobe: int | None = None) -> np.ndarray:
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        lists = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        parts = [self.rows[self.offsets[c]:self.offsets[c + 1]] for c in lists]
+        parts.append(np.arange(self.n_rows, total_rows))
+        return np.sort(np.concatenate(parts))
+
+    def save(self, path: str):
+        np.savez(path, centroids=self.centroids, offsets=self.offsets, rows=self.rows,
+                 nprobe=np.array(self.nprobe))
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["offsets"], data["rows"], nprobe=int(data["nprobe"]))
+
+
+class ScalarCodes:
+    """int8 copies of normalised rows, searched in place of the float32 matrix.
+
+    Each dimension is scaled so its largest magnitude across the rows maps
+    to 127. Scores against the codes are approximate; the store rescores
+    the best `rescore` times k of them at full precision. Rows appended
+    after the codes were built are always scored exactly.
+    """
+
+    MODES = ("int8",)
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray, rescore: int = 4):
+        self.codes = codes
+        self.scales = scales
+        self.rescore = rescore
+
+    @property
+    def mode(self) -> str:
+        return np.dtype(self.codes.dtype).name
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, mode: str = "int8", rescore: int = 4, block: int = 65536) -> "ScalarCodes":
+        if mode not in cls.MODES:
+            raise ValueError(f"Unknown quantization {mode!r}; expected one of {', '.join(cls.MODES)}")
+        peak = np.zeros(matrix.shape[1], dtype=np.float32)
+        for i in range(0, len(matrix), block):
+            peak = np.maximum(peak, np.abs(matrix[i:i + block]).max(axis=0))
+        scales = np.where(peak == 0, 1, peak / 127).astype(np.float32)
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        for i in range(0, len(matrix), block):
+            codes[i:i + block] = np.rint(matrix[i:i + block] / scales)
+        return cls(codes, scales, rescore=rescore)
+
+    def scores(self, queries: np.ndarray, rows: np.ndarray | None = None, block: int = 256) -> np.ndarray:
+        """Approximate similarities of queries (one or a batch) to rows; every coded row when None."""
+        scaled = queries * self.scales
+        n = self.n_rows if rows is None else len(rows)
+        out = np.empty(scaled.shape[:-1] + (n,), dtype=np.float32)
+        # Widen a cache-sized block at a time; one large float32 copy is slower than the float32 matrix
+        for i in range(0, n, block):
+            part = self.codes[i:i + block] if rows is None else self.codes[rows[i:i + block]]
+            out[..., i:i + block] = scaled @ part.astype(np.float32).T
+        return out
+
+    def save(self, persist_dir: str):
+        tmp = os.path.join(persist_dir, CODES_FNAME + ".tmp")
+        with open(tmp, 'wb') as f:
+            np.save(f, self.codes)
+        os.replace(tmp, os.path.join(persist_dir, CODES_FNAME))
+        np.savez(os.path.join(persist_dir, CODES_META_FNAME), scales=self.scales, rescore=np.array(self.rescore))
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "ScalarCodes":
+        with np.load(os.path.join(persist_dir, CODES_META_FNAME)) as meta:
+            scales, rescore = meta["scales"], int(meta["rescore"])
+        return cls(np.load(os.path.join(persist_dir, CODES_FNAME), mmap_mode='r'), scales, rescore=rescore)
+
+    @staticmethod
+    def remove(persist_dir: str):
+        for fname in (CODES_FNAME, CODES_META_FNAME):
+            path = os.path.join(persist_dir, fname)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """Local vector store kept as one contiguous, memory-mapped float32 matrix.
+
+    Rows are L2-normalised when added, so a query is a single matrix-vector
+    product followed by argpartition for the top k. Node text stays in the
+    docstore; only ids and vectors live here. Pass `min_similarity` through
+    `vector_store_kwargs` to drop weak matches inside the search itself.
+
+    When an IVF index has been configured it is rebuilt on every persist and
+    used for search; pass `nprobe` through `vector_store_kwargs` to trade
+    recall for speed per query, or `exact=True` to bypass it.
+
+    Likewise, configured int8 codes are rebuilt on every persist
+    and scanned instead of the matrix; only the shortlist they select is
+    read back from the float32 rows and rescored, so the full matrix stays
+    on disk. `rescore` sets the shortlist size per query, as a multiple of
+    the top k; `exact=True` bypasses the codes too.
+
+    A query carrying `node_ids` (a metadata pre-filter) scores just those
+    rows, found through a cached id -> row map, and skips the IVF index.
+    """
+
+    stores_text: bool = False
+    is_embedding_query: bool = True
+
+    _matrix: np.ndarray = PrivateAttr()
+    _node_ids: list = PrivateAttr()
+    _ref_doc_ids: list = PrivateAttr()
+    _added: list = PrivateAttr()
+    _deleted: set = PrivateAttr()
+    _dirty: bool = PrivateAttr()
+    _ann: IVFIndex | None = PrivateAttr()
+    _ann_config: tuple | None = PrivateAttr()
+    _codes: ScalarCodes | None = PrivateAttr()
+    _codes_config: tuple | None = PrivateAttr()
+    _positions: dict | None = PrivateAttr()
+
+    def __init__(self, matrix: np.ndarray | None = None, node_ids: list | None = None,
+                 ref_doc_ids: list | None = None, ann: IVFIndex | None = None,
+                 codes: ScalarCodes | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self._ann = ann
+        self._ann_config = (ann.nlist, ann.nprobe) if ann is not None else None
+        self._codes = codes
+        self._codes_config = (codes.mode, codes.rescore) if codes is not None else None
+        self._matrix = matrix if matrix is not None else np.empty((0, 0), dtype=np.float32)
+        self._node_ids = list(node_ids or [])
+        self._ref_doc_ids = list(ref_doc_ids or [])
+        self._added = []
+        self._deleted = set()
+        self._dirty = False
+        self._positions = None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> "MmapVectorStore":
+        vectors_path = os.path.join(persist_dir, VECTORS_FNAME)
+        if os.path.exists(vectors_path):
+            with open(os.path.join(persist_dir, IDS_FNAME)) as f:
+                ids = json.load(f)
+            matrix = np.load(vectors_path, mmap_mode='r')
+            ann_path = os.path.join(persist_dir, ANN_FNAME)
+            ann = IVFIndex.load(ann_path) if os.path.exists(ann_path) else None
+            has_codes = os.path.exists(os.path.join(persist_dir, CODES_META_FNAME))
+            codes = ScalarCodes.load(persist_dir) if has_codes else None
+            return cls(matrix, ids["node_ids"], ids["ref_doc_ids"], ann=ann, codes=codes)
+
+        legacy_path = os.path.join(persist_dir, LEGACY_FNAME)
+        if os.path.exists(legacy_path):
+            # Index built with the default JSON vector store; convert on next persist
+            with open(legacy_path) as f:
+                data = json.load(f)
+            node_ids = list(data["embedding_dict"])
+            matrix = normalize(np.asarray([data["embedding_dict"][i] for i in node_ids], dtype=np.float32))
+            store = cls(matrix, node_ids, [data["text_id_to_ref_doc_id"].get(i) for i in node_ids])
+            store._dirty = True
+            return store
+        return cls()
+
+    @property
+    def client(self) -> None:
+        return None
+
+    def __len__(self) -> int:
+        return len(self._node_ids) - len(self._deleted)
+
+    def __bool__(self) -> bool:
+        # StorageContext tests stores for truth; an empty store must not be swapped for a default one
+        return True
+
+    def configure_ann(self, nlist: int, nprobe: int = 8):
+        """Build an IVF index with nlist lists on the next persist; 0 removes it."""
+        config = (nlist, nprobe) if nlist else None
+        if config != self._ann_config:
+            self._ann_config = config
+            self._dirty = True
+
+    def configure_quantization(self, mode: str | None, rescore: int = 4):
+        """Build int8 codes on the next persist; None (or "none") removes them."""
+        if mode not in (None, "none") and mode not in ScalarCodes.MODES:
+            raise ValueError(f"Unknown quantization {mode!r}; expected one of {', '.join(ScalarCodes.MODES)}")
+        config = (mode, rescore) if mode not in (None, "none") else None
+        if config != self._codes_config:
+            self._codes_config = config
+            self._dirty = True
+
+    def get_embeddings(self, node_ids: list) -> np.ndarray | None:
+        """Normalised stored vectors for node_ids, in order; None if any is missing."""
+        self._materialize()
+        position = self._row_positions()
+        rows = [position.get(node_id) for node_id in node_ids]
+        if None in rows or self._matrix.size == 0:
+            return None
+        return np.asarray(self._matrix[rows], dtype=np.float32)
+
+    def _row_positions(self) -> dict:
+        # node id -> row of every live node; rebuilt after the rows change
+        if self._positions is None:
+            self._positions = {node_id: i for i, node_id in enumerate(self._node_ids) if i not in self._deleted}
+        return self._positions
+
+    def _rows_of(self, node_ids: list) -> np.ndarray:
+        """Sorted rows of the live nodes among node_ids; unknown and deleted ids are skipped."""
+        position = self._row_positions()
+        rows = [position[node_id] for node_id in node_ids if node_id in position]
+        return np.unique(np.asarray(rows, dtype=np.int64))
+
+    def _materialize(self):
+        # Fold rows added since the last persist or query into the matrix
+        if self._added:
+            added = np.vstack(self._added)
+            self._matrix = added if self._matrix.size == 0 else np.vstack([self._matrix, added])
+            self._added = []
+
+    def add(self, nodes: list[BaseNode], **add_kwargs) -> list:
+        if not nodes:
+            return []
+        vectors = normalize(np.asarray([node.get_embedding() for node in nodes], dtype=np.float32))
+        self._added.append(vectors)
+        self._node_ids.extend(node.node_id for node in nodes)
+        self._ref_doc_ids.extend(node.ref_doc_id for node in nodes)
+        self._dirty = True
+        self._positions = None
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs) -> None:
+        rows = [i for i, ref in enumerate(self._ref_doc_ids) if ref == ref_doc_id and i not in self._deleted]
+        if rows:
+            self._deleted.update(rows)
+            self._dirty = True
+            self._positions = None
+
+    def clear(self) -> None:
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._node_ids, self._ref_doc_ids = [], []
+        self._added = []
+        self._deleted = set()
+        self._dirty = True
+        self._positions = None
+
+    def _coded_scores(self, queries: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        # Approximate scores from the codes, exact ones for rows added since they were built
+        n = self._codes.n_rows
+        if rows is None:
+            return np.concatenate([self._codes.scores(queries), queries @ self._matrix[n:].T], axis=-1)
+        coded = rows < n
+        scores = np.empty(queries.shape[:-1] + (len(rows),), dtype=np.float32)
+        scores[..., coded] = self._codes.scores(queries, rows[coded])
+        scores[..., ~coded] = queries @ self._matrix[rows[~coded]].T
+        return scores
+
+    def _rescore(self, q: np.ndarray, rows: np.ndarray, scores: np.ndarray, k: int,
+                 rescore: int | None) -> tuple:
+        best = top_k(scores, k * (rescore or self._codes.rescore))
+        # Rows masked out with -inf must not come back through rescoring
+        shortlist = rows[best[np.isfinite(scores[best])]]
+        # Fancy indexing reads just these rows from the mapped matrix
+        return shortlist, self._matrix[shortlist] @ q
+
+    def query(self, query: VectorStoreQuery, min_similarity: float | None = None,
+              nprobe: int | None = None, exact: bool = False, rescore: int | None = None,
+              **kwargs) -> VectorStoreQueryResult:
+        self._materialize()
+        if self._matrix.size == 0 or query.query_embedding is None:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        q = normalize(np.asarray(query.query_embedding, dtype=np.float32))
+        quantized = self._codes is not None and not exact
+        # VectorStoreIndex.as_retriever passes every node id, which is no filter at all;
+        # telling that from the count skips a pass over them on every query
+        scoped = query.node_ids is not None and len(query.node_ids) < len(self)
+        if scoped:
+            # Pre-filtered: score only the allowed rows, which beats probing lists for a small scope
+            rows = self._rows_of(query.node_ids)
+            scores = self._coded_scores(q, rows) if quantized else self._matrix[rows] @ q
+        elif self._ann is not None and not exact:
+            rows = self._ann.candidates(q, len(self._node_ids), nprobe)
+            scores = self._coded_scores(q, rows) if quantized else self._matrix[rows] @ q
+        else:
+            rows = np.arange(len(self._node_ids))
+            scores = self._coded_scores(q) if quantized else self._matrix @ q
+
+        keep = np.ones(len(rows), dtype=bool)
+        if self._deleted and not scoped:
+            keep &= ~np.isin(rows, list(self._deleted))
+        if quantized:
+            rows, scores = self._rescore(q, rows[keep], scores[keep], query.similarity_top_k, rescore)
+            keep = np.ones(len(rows), dtype=bool)
+        if min_similarity is not None:
+            keep &= scores >= min_similarity
+
+        rows, scores = rows[keep], scores[keep]
+        best = top_k(scores, query.similarity_top_k)
+        return VectorStoreQueryResult(
+            # The retriever fills in nodes from the docstore, but expects a list when nothing matched
+            nodes=None if len(best) else [],
+            similarities=scores[best].tolist(),
+            ids=[self._node_ids[i] for i in rows[best]]
+        )
+
+    def query_batch(self, embeddings: list, similarity_top_k: int, min_similarity: float | None = None,
+                    block: int = 64, exact: bool = False) -> list:
+        """Search for many queries at once; one VectorStoreQueryResult per embedding.
+
+        Queries are scored `block` at a time with a single matrix product, so
+        a batch of questions reads the matrix (or its codes, then each
+        query's shortlist) once per block instead of once per question. The
+        IVF index is not used here.
+        """
+        self._materialize()
+        if self._matrix.size == 0 or len(embeddings) == 0:
+            return [VectorStoreQueryResult(nodes=[], similarities=[], ids=[]) for _ in embeddings]
+
+        queries = normalize(np.asarray(embeddings, dtype=np.float32))
+        quantized = self._codes is not None and not exact
+        deleted = np.fromiter(self._deleted, dtype=np.int64, count=len(self._deleted))
+        rows = np.arange(len(self._node_ids))
+        results = []
+        for start in range(0, len(queries), block):
+            part = queries[start:start + block]
+            scores = self._coded_scores(part) if quantized else part @ self._matrix.T
+            scores[:, deleted] = -np.inf
+            for q, row in zip(part, scores):
+                if quantized:
+                    found, row = self._rescore(q, rows, row, similarity_top_k, None)
+                else:
+                    found = rows
+                best = top_k(row, similarity_top_k)
+                if min_similarity is not None:
+                    best = best[row[best] >= min_similarity]
+                results.append(VectorStoreQueryResult(
+                    nodes=None,
+                    similarities=row[best].tolist(),
+                    ids=[self._node_ids[i] for i in found[best]]
+                ))
+        return results
+
+    def persist(self, persist_path: str, fs: fsspec.AbstractFileSystem | None = None) -> None:
+        """Write the matrix and ids into the directory of persist_path."""
+        persist_dir = os.path.dirname(persist_path)
+        if not self._dirty and os.path.exists(os.path.join(persist_dir, VECTORS_FNAME)):
+            return
+        self._materialize()
+        keep = [i for i in range(len(self._node_ids)) if i not in self._deleted]
+        matrix = np.ascontiguousarray(self._matrix[keep] if self._matrix.size else self._matrix,
+                                      dtype=np.float32)
+        node_ids = [self._node_ids[i] for i in keep]
+        ref_doc_ids = [self._ref_doc_ids[i] for i in keep]
+
+        os.makedirs(persist_dir, exist_ok=True)
+        # Write beside and swap in, since the old file may still be mapped
+        tmp = os.path.join(persist_dir, VECTORS_FNAME + ".tmp")
+        with open(tmp, 'wb') as f:
+            np.save(f, matrix)
+        os.replace(tmp, os.path.join(persist_dir, VECTORS_FNAME))
+        with open(os.path.join(persist_dir, IDS_FNAME), 'w') as f:
+            json.dump({"node_ids": node_ids, "ref_doc_ids": ref_doc_ids}, f)
+        legacy_path = os.path.join(persist_dir, LEGACY_FNAME)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+        # Row numbers change on every compaction, so the IVF index is rebuilt
+        ann_path = os.path.join(persist_dir, ANN_FNAME)
+        if self._ann_config and len(matrix):
+            self._ann = IVFIndex.build(matrix, *self._ann_config)
+            self._ann.save(ann_path)
+        else:
+            self._ann = None
+            if os.path.exists(ann_path):
+                os.remove(ann_path)
+        if self._codes_config and len(matrix):
+            self._codes = ScalarCodes.build(matrix, *self._codes_config)
+            self._codes.save(persist_dir)
+            self._codes = ScalarCodes.load(persist_dir)
+        else:
+            self._codes = None
+            ScalarCodes.remove(persist_dir)
+
+        self._matrix = np.load(os.path.join(persist_dir, VECTORS_FNAME), mmap_mode='r')
+        self._node_ids, self._ref_doc_ids = node_ids, ref_doc_ids
+        self._deleted = set()
+        self._dirty = False
+        self._positions = None